@@ -0,0 +1,80 @@
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from app.core.config import settings
+from app.core.serialization import serialize_documents
+from app.models.product import Product
+
+class CatalogCache:
+    """
+    Pre-serialised product listings keyed by query.
+    Every product write (create/update/delete, stock reservations) bumps the
+    version, which drops all cached pages. The TTL bounds how long another
+    worker's writes can go unnoticed.
+    """
+
+    max_entries = 64
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self._entries: Dict[Tuple, Tuple[int, float, bytes, str, Optional[str]]] = {}
+        # (key, version) -> the fetch other requests for the same page wait on
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+
+    def bump(self):
+        self.version += 1
+        self._entries.clear()
+
+    def _lookup(self, key: Tuple) -> Optional[Tuple[bytes, str, Optional[str]]]:
+        entry = self._entries.get(key)
+        if entry and entry[0] == self.version and time.monotonic() < entry[1]:
+            return entry[2:]
+        return None
+
+    async def get(
+        self,
+        key: Tuple,
+        fetch: Callable[[], Awaitable[Tuple[List[dict], Optional[str]]]],
+        model: Type[BaseModel] = Product,
+    ) -> Tuple[bytes, str, Optional[str]]:
+        """
+        Returns the JSON body, its strong ETag and the next page cursor for a
+        listing. key identifies the query (filters, cursor, limit, view); fetch
+        loads the documents and the next cursor on a miss, model shapes them.
+        """
+        cached = self._lookup(key)
+        if cached:
+            return cached
+        # Misses on the same page share one fetch; different pages don't wait
+        # on each other. A bump starts new fetches instead of joining old ones.
+        flight = (key, self.version)
+        if flight not in self._in_flight:
+            task = asyncio.ensure_future(self._load(key, fetch, model))
+            self._in_flight[flight] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(flight, None))
+        # shield: a cancelled request must not cancel the fetch other requests wait on
+        return await asyncio.shield(self._in_flight[flight])
+
+    async def _load(self, key: Tuple, fetch: Callable[[], Awaitable[Tuple[List[dict], Optional[str]]]], model: Type[BaseModel]) -> Tuple[bytes, str, Optional[str]]:
+        version = self.version
+        products, cursor = await fetch()
+        # Serialised once here instead of on every request
+        body = serialize_documents(products, model)
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if version == self.version:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (version, time.monotonic() + self.ttl, body, etag, cursor)
+        return body, etag, cursor
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison, so a W/ prefix still matches
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+catalog_cache = CatalogCache(ttl=settings.CATALOG_CACHE_TTL_SECONDS)
@@ -0,0 +1,199 @@
+from datetime import datetime
+from typing import Any, Dict, List
+from bson import ObjectId
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.db.mongodb import mongodb
+from app.models.order import OrderCreate
+from app.core.user_cache import user_cache
+from app.core.catalog_cache import catalog_cache
+from app.core.events import event_bus, OrderCreated, StockLow
+from app.core.payments import payment_gateway, PaymentUnavailable, PaymentRejected
+from app.core.price_book import price_book, UnknownProduct, to_cents, to_euros
+from app.core.reservations import reserve_stock, release_stock, reservation_expiry
+
+# Checkout pipeline
+# -----------------
+#   validate -> price -> payment -> reserve + persist
+# Everything that can reject a checkout (missing tax code, unknown products,
+# stock, total mismatch) runs before the first write. Pricing uses the price
+# book, so checkout charges exactly what POST /orders/quote showed. Reserve + persist (stock
+# decrement, order insert, profile update, OrderCreated event) then run in one
+# multi-document transaction: if any step fails nothing was written, so there
+# is no compensating $inc. Write conflicts between checkouts of the same wine
+# are transient errors and with_transaction retries them. Nothing every
+# checkout shares is written inside the transaction: the daily_sales rollup
+# (one document per day) is counted by an OrderCreated consumer after commit.
+# Transactions need a replica set; on a standalone server the same steps run
+# without a session and stock is released if the order insert fails.
+# StockLow is decided right after the decrement, from the stock this order
+# left, and published with OrderCreated; the confirmation email is an
+# OrderCreated consumer.
+
+# Allowance for the database work around the payment call (reads, transaction retries)
+CHECKOUT_DB_SECONDS = 10.0
+
+class OutOfStock(Exception):
+    pass
+
+def checkout_deadline() -> float:
+    """Longest a checkout can reasonably run: the Stripe call with all its retries plus the database work."""
+    return payment_gateway.deadline + CHECKOUT_DB_SECONDS
+
+def validate_order(order_in: OrderCreate, current_user: Dict[str, Any]) -> Dict[str, Any]:
+    """Checks the request itself: product ids and tax code. Returns quantities per product."""
+    quantities: Dict[str, int] = {}
+    for item in order_in.items:
+        if not ObjectId.is_valid(item.product_id):
+            raise HTTPException(status_code=400, detail=f"Prodotto non trovato: {item.name}")
+        # Summed in case the same wine appears on several lines
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    if not quantities:
+        raise HTTPException(status_code=400, detail="Il carrello è vuoto.")
+
+    # The payload wins, the profile is the fallback
+    tax_code = order_in.customer_tax_code or current_user.get("tax_code")
+    if not tax_code:
+        raise HTTPException(status_code=400, detail="Codice Fiscale obbligatorio.")
+    return {"quantities": quantities, "tax_code": tax_code}
+
+async def price_order(order_in: OrderCreate, quantities: Dict[str, int]) -> Dict[str, Any]:
+    """Prices the cart from the price book (like POST /orders/quote), checks stock and the client's total."""
+    await price_book.ensure_fresh()
+    # Early stock check so a sold-out cart fails before the payment intent;
+    # the guarded reservation stays the authoritative one. The same read
+    # brings the book up to date for products edited on another worker.
+    products = await mongodb.db.products.find(
+        {"_id": {"$in": [ObjectId(pid) for pid in quantities]}},
+        {"stock": 1, "price": 1, "name": 1}
+    ).to_list(len(quantities))
+    price_book.sync(products)
+    stock_by_id = {str(p["_id"]): p.get("stock", 0) for p in products}
+    for item in order_in.items:
+        if item.product_id not in stock_by_id:
+            # Deleted meanwhile, possibly through another worker
+            price_book.remove(item.product_id)
+            raise HTTPException(status_code=400, detail=f"Prodotto non trovato: {item.name}")
+        current_stock = stock_by_id[item.product_id]
+        if current_stock < quantities[item.product_id]:
+            raise HTTPException(status_code=400, detail=f"Quantità non disponibile per {item.name}. Disponibili: {current_stock}")
+
+    try:
+        quote = price_book.quote(quantities)
+    except UnknownProduct as e:
+        name = next((item.name for item in order_in.items if item.product_id == e.product_id), e.product_id)
+        raise HTTPException(status_code=400, detail=f"Prodotto non trovato: {name}")
+
+    # Allow 10 cents of tolerance for totals computed client-side
+    if abs(to_cents(order_in.total_amount) - quote["total_cents"]) > 10:
+        raise HTTPException(status_code=400, detail=f"Totale ordine non valido. Backend: {to_euros(quote['total_cents'])}, Frontend: {order_in.total_amount}")
+    return quote
+
+def profile_changes(order_in: OrderCreate, tax_code: str, current_user: Dict[str, Any]) -> Dict[str, Any]:
+    """Checkout data that differs from the saved profile (empty when the profile is up to date)."""
+    latest = {
+        "shipping_address": order_in.shipping_address.dict(),
+        "billing_address": order_in.billing_address.dict(),
+        "tax_code": tax_code,
+    }
+    return {field: value for field, value in latest.items() if current_user.get(field) != value}
+
+def order_created(order_data: Dict[str, Any]) -> OrderCreated:
+    return OrderCreated(
+        order_id=str(order_data["_id"]),
+        user_id=order_data["user_id"],
+        customer_name=order_data.get("customer_name"),
+        customer_email=order_data.get("customer_email"),
+        status=order_data["status"],
+        total_amount=order_data["total_amount"],
+        items=order_data["items"],
+        created_at=order_data["created_at"],
+    )
+
+async def stock_low_events(quantities: Dict[str, int], session=None) -> List[StockLow]:
+    """StockLow for the wines this order just took to LOW_STOCK_THRESHOLD or below. Call right after reserve_stock."""
+    # Inside the transaction the read sees exactly the stock this order left.
+    # Without one, a concurrent checkout of the same wine can slip in between.
+    products = await mongodb.db.products.find(
+        {"_id": {"$in": [ObjectId(pid) for pid in quantities]}, "stock": {"$lte": settings.LOW_STOCK_THRESHOLD}},
+        {"name": 1, "stock": 1},
+        session=session,
+    ).to_list(len(quantities))
+    # Only the order that crossed the threshold raises the alert
+    return [
+        StockLow(product_id=str(p["_id"]), name=p.get("name"), stock=p.get("stock", 0))
+        for p in products
+        if p.get("stock", 0) + quantities[str(p["_id"])] > settings.LOW_STOCK_THRESHOLD
+    ]
+
+async def reserve_and_persist(order_data: Dict[str, Any], quantities: Dict[str, int], profile_update: Dict[str, Any], user_id):
+    async def persist(session):
+        if not await reserve_stock(order_data["_id"], quantities, session=session):
+            raise OutOfStock()
+        low = await stock_low_events(quantities, session=session)
+        await mongodb.db.orders.insert_one(order_data, session=session)
+        if profile_update:
+            await mongodb.db.users.update_one({"_id": user_id}, {"$set": profile_update}, session=session)
+        await event_bus.publish(order_created(order_data), *low, session=session)
+
+    if mongodb.supports_transactions:
+        async with await mongodb.client.start_session() as session:
+            await session.with_transaction(persist)
+        return
+
+    if not await reserve_stock(order_data["_id"], quantities):
+        raise OutOfStock()
+    low = await stock_low_events(quantities)
+    try:
+        await mongodb.db.orders.insert_one(order_data)
+    except Exception:
+        # No transaction to roll back: give back what this order took
+        await release_stock(order_data["_id"], quantities)
+        raise
+    # The order exists from here on; its hold is released by cancel or expiry
+    if profile_update:
+        await mongodb.db.users.update_one({"_id": user_id}, {"$set": profile_update})
+    await event_bus.publish(order_created(order_data), *low)
+
+async def run_checkout(order_in: OrderCreate, current_user: Dict[str, Any]) -> Dict[str, str]:
+    validated = validate_order(order_in, current_user)
+    quantities = validated["quantities"]
+    quote = await price_order(order_in, quantities)
+
+    # The intent is created before any write: it is idempotent per order id, and
+    # an intent left unused by a failed checkout is never confirmed nor charged.
+    order_id = ObjectId()
+    try:
+        intent = await payment_gateway.create_payment_intent(quote["total_cents"], str(order_id))
+    except PaymentUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
+    except PaymentRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    order_data = order_in.dict()
+    order_data.update({
+        "_id": order_id,
+        # The server's total, the same amount the payment intent was created for
+        "total_amount": to_euros(quote["total_cents"]),
+        "user_id": str(current_user["_id"]),
+        "customer_name": current_user.get("full_name"),
+        "customer_email": current_user.get("email"),
+        "customer_tax_code": validated["tax_code"],
+        "status": "pending",
+        "stripe_payment_intent_id": intent["id"],
+        # Kept on the order so exports split VAT with the rate used at checkout
+        "vat_rate": quote["vat_rate"],
+        "created_at": datetime.utcnow(),
+        # Stock stays held for this order until it is paid, cancelled or expires
+        "reservation_expires_at": reservation_expiry(),
+    })
+    profile_update = profile_changes(order_in, validated["tax_code"], current_user)
+
+    try:
+        await reserve_and_persist(order_data, quantities, profile_update, current_user["_id"])
+    except OutOfStock:
+        raise HTTPException(status_code=400, detail="Quantità non più disponibile per uno o più prodotti. Riprova.")
+    catalog_cache.bump()
+    if profile_update:
+        user_cache.invalidate(current_user["_id"])
+    return {"orderId": str(order_id), "clientSecret": intent["client_secret"]}
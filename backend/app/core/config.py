@@ -1,21 +1,111 @@
 
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 import json
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "ColleShop"
     MONGO_URI: str
+    # Connection pool (per worker process)
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    # Wire compression, e.g. "zstd,snappy,zlib" (zstd/snappy need their python packages)
+    MONGO_COMPRESSORS: str = ""
+    # Read preferences for lag-tolerant reads, e.g. "secondaryPreferred" on a replica set
+    MONGO_ANALYTICS_READ_PREFERENCE: str = "primary"
+    MONGO_CATALOG_READ_PREFERENCE: str = "primary"
+    # Skip secondaries lagging more than this (-1: no limit, otherwise at least 90)
+    MONGO_MAX_STALENESS_SECONDS: int = -1
+    # Readiness fails when the ping takes longer than this
+    HEALTH_PING_TIMEOUT_SECONDS: float = 2.0
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     CORS_ORIGINS: List[str] = ["http://localhost:3000"]
     STRIPE_SECRET_KEY: str = ""
     STRIPE_PUBLISHABLE_KEY: str = ""
+    # Stripe calls run on their own thread pool, with a per-attempt timeout
+    STRIPE_WORKERS: int = 8
+    STRIPE_TIMEOUT_SECONDS: float = 10.0
+    STRIPE_MAX_RETRIES: int = 2
+    # Consecutive failures that open the circuit breaker, and how long it stays open
+    STRIPE_BREAKER_FAILURES: int = 5
+    STRIPE_BREAKER_RESET_SECONDS: float = 30.0
+    # Alternative API base, e.g. http://127.0.0.1:12111 for fake_stripe.py
+    STRIPE_API_BASE: str = ""
     
     SMTP_SERVER: str = "smtp.gmail.com"
     SMTP_PORT: int = 587
     SENDER_EMAIL: str = ""
     SENDER_PASSWORD: str = ""
+    # Set SMTP_USE_TLS=false and leave SENDER_PASSWORD empty for a local sink (e.g. aiosmtpd)
+    SMTP_USE_TLS: bool = True
+    SMTP_TIMEOUT: float = 30.0
+    # Sender threads, each keeping one authenticated connection open while busy
+    SMTP_SENDERS: int = 2
+    SMTP_IDLE_SECONDS: float = 60.0
+    # A connection idle for longer is checked with NOOP before reuse
+    SMTP_PROBE_AFTER_SECONDS: float = 10.0
+    # Outbox dispatching and retries
+    EMAIL_BATCH_SIZE: int = 20
+    EMAIL_POLL_SECONDS: float = 10.0
+    EMAIL_LEASE_SECONDS: int = 300
+    EMAIL_MAX_ATTEMPTS: int = 6
+    EMAIL_RETRY_BASE_SECONDS: int = 30
+    # Sent messages are deleted after this many days; failed ones are kept
+    EMAIL_RETENTION_DAYS: int = 30
+
+    # Order lifecycle events: polling fallback (standalone mongod), retries, retention
+    EVENTS_POLL_SECONDS: float = 5.0
+    EVENTS_LEASE_SECONDS: int = 300
+    EVENTS_MAX_ATTEMPTS: int = 6
+    EVENTS_RETRY_BASE_SECONDS: int = 30
+    EVENTS_RETENTION_DAYS: int = 30
+    # StockLow is published when an order takes a wine down to this stock or below
+    LOW_STOCK_THRESHOLD: int = 5
+
+    # Stock held by a pending order is released after this many minutes
+    STOCK_RESERVATION_MINUTES: int = 30
+    RESERVATION_SWEEP_SECONDS: int = 60
+
+    # Site settings are served from memory; the watch keeps several workers in sync (replica set only)
+    SETTINGS_CACHE_TTL_SECONDS: float = 60.0
+    SETTINGS_CACHE_WATCH: bool = False
+    CATALOG_CACHE_TTL_SECONDS: float = 30.0
+    # In-process fuzzy search index; rebuilt after this to pick up other workers' product writes
+    SEARCH_INDEX_TTL_SECONDS: float = 60.0
+    # In-memory gross price book; bounds how long other workers' price edits go unnoticed
+    PRICE_BOOK_TTL_SECONDS: float = 30.0
+    # Admin dashboard payload: fresh for TTL, then served stale while it refreshes
+    DASHBOARD_CACHE_TTL_SECONDS: float = 10.0
+    DASHBOARD_CACHE_STALE_SECONDS: float = 60.0
+    # Authenticated user lookups (get_current_user)
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60.0
+    # Idempotency-Key: how long keys are kept, how long duplicates wait for the first request
+    # (unset: as long as a checkout can take, i.e. the Stripe deadline plus the database work;
+    # on timeout they get a 409 with Retry-After). The claim lease never expires before
+    # that wait is over, so a slow first request isn't taken over and run twice.
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_WAIT_SECONDS: Optional[float] = None
+    IDEMPOTENCY_LEASE_SECONDS: int = 60
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    # Request metrics: requests slower than this are logged with their queries
+    SLOW_REQUEST_MS: int = 500
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+    # Validate list responses through the Pydantic models instead of the orjson fast path
+    STRICT_RESPONSE_VALIDATION: bool = False
+
+    # Argon2 cost parameters for new hashes; existing hashes keep their own parameters
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 4
+    # Hashing pool: worker threads, callers allowed to wait, max wait before a 503
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = 5.0
 
     class Config:
         env_file = ".env"
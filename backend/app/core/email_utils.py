@@ -1,33 +1,195 @@
+import asyncio
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import Any, Dict, List, Tuple
+from pymongo import ReturnDocument, UpdateOne
 from app.core.config import settings
+from app.db.mongodb import mongodb
 
-def send_email_background(to_email: str, subject: str, html_content: str):
-    """
-    Sends an email in the background (synchronous function run in thread by FastAPI).
-    """
-    if not settings.SENDER_EMAIL or not settings.SENDER_PASSWORD:
+# Email outbox
+# ------------
+# Handlers only insert the message into the `email_outbox` collection, so mail
+# survives restarts. The dispatcher loop (started with the app) claims pending
+# messages in batches and hands each batch to a small dedicated sender pool.
+# Every sender thread keeps its SMTP connection (STARTTLS + login done once)
+# open between batches. Failed messages are retried with exponential backoff.
+# Sent messages expire after EMAIL_RETENTION_DAYS (TTL index on sent_at).
+
+_senders = ThreadPoolExecutor(max_workers=settings.SMTP_SENDERS, thread_name_prefix="smtp")
+_local = threading.local()
+_wakeup = asyncio.Event()
+
+def email_configured() -> bool:
+    return bool(settings.SENDER_EMAIL)
+
+def build_message(to_email: str, subject: str, html_content: str) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["Subject"] = subject
+    message["From"] = settings.SENDER_EMAIL
+    message["To"] = to_email
+
+    # HTML body
+    html_part = MIMEText(html_content, "html")
+    message.attach(html_part)
+    return message
+
+def _connect() -> smtplib.SMTP:
+    server = smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+    if settings.SMTP_USE_TLS:
+        server.starttls()
+    if settings.SENDER_PASSWORD:
+        server.login(settings.SENDER_EMAIL, settings.SENDER_PASSWORD)
+    return server
+
+def _connection() -> smtplib.SMTP:
+    """Returns this sender thread's SMTP connection, reconnecting if it went idle or stale."""
+    server = getattr(_local, "server", None)
+    idle = time.monotonic() - getattr(_local, "last_used", 0.0)
+    if server is not None and idle > settings.SMTP_IDLE_SECONDS:
+        _close()
+        server = None
+    # A connection used moments ago is reused as is: a NOOP round trip per
+    # message would cost more than the rare disconnect, which _send_batch
+    # handles by dropping the connection and retrying the message later.
+    if server is not None and idle > settings.SMTP_PROBE_AFTER_SECONDS:
+        try:
+            server.noop()
+        except smtplib.SMTPException:
+            _close()
+            server = None
+    if server is None:
+        server = _connect()
+        _local.server = server
+        _local.last_used = time.monotonic()
+    return server
+
+def _close():
+    server = getattr(_local, "server", None)
+    _local.server = None
+    if server is not None:
+        try:
+            server.quit()
+        except Exception:
+            pass
+
+def _send_batch(messages: List[Dict[str, Any]]) -> List[Tuple[Any, str]]:
+    """Runs on a sender thread. Returns (message id, error) pairs, error is '' on success."""
+    results = []
+    for message in messages:
+        try:
+            server = _connection()
+            mime = build_message(message["to"], message["subject"], message["html"])
+            server.sendmail(settings.SENDER_EMAIL, message["to"], mime.as_string())
+            _local.last_used = time.monotonic()
+            results.append((message["_id"], ""))
+        except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError) as e:
+            # Connection is gone: drop it, the next message reconnects
+            _close()
+            results.append((message["_id"], str(e) or type(e).__name__))
+        except Exception as e:
+            results.append((message["_id"], str(e) or type(e).__name__))
+    return results
+
+def outbox_document(to_email: str, subject: str, html_content: str) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    return {
+        "to": to_email,
+        "subject": subject,
+        "html": html_content,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+
+async def enqueue_email(to_email: str, subject: str, html_content: str):
+    """Stores the email in the outbox; it is sent by the dispatcher shortly after."""
+    await enqueue_emails([(to_email, subject, html_content)])
+
+async def enqueue_emails(emails: List[Tuple[str, str, str]]):
+    """Stores several (to, subject, html) emails with a single insert."""
+    if not email_configured():
         print("Email configuration missing. Skipping email send.")
         return
+    if not emails:
+        return
+    await mongodb.db.email_outbox.insert_many([outbox_document(*email) for email in emails])
+    _wakeup.set()
+
+async def claim_batch() -> List[Dict[str, Any]]:
+    """Claims up to EMAIL_BATCH_SIZE due messages, including ones whose sender lease ran out."""
+    now = datetime.utcnow()
+    lease = now + timedelta(seconds=settings.EMAIL_LEASE_SECONDS)
+    batch = []
+    for _ in range(settings.EMAIL_BATCH_SIZE):
+        message = await mongodb.db.email_outbox.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "lease_until": {"$lte": now}},
+            ]},
+            {"$set": {"status": "sending", "lease_until": lease}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if message is None:
+            break
+        batch.append(message)
+    return batch
+
+async def dispatch_batch() -> int:
+    """Sends one batch from the outbox and records the outcome. Returns the batch size."""
+    batch = await claim_batch()
+    if not batch:
+        return 0
+
+    results = await asyncio.get_running_loop().run_in_executor(_senders, _send_batch, batch)
+    attempts = {message["_id"]: message.get("attempts", 0) + 1 for message in batch}
+    now = datetime.utcnow()
+    updates = []
+    for message_id, error in results:
+        if not error:
+            updates.append(UpdateOne({"_id": message_id}, {
+                "$set": {"status": "sent", "sent_at": now},
+                "$unset": {"lease_until": "", "last_error": ""},
+                "$inc": {"attempts": 1},
+            }))
+            continue
+        tries = attempts[message_id]
+        print(f"Failed to send email {message_id} (attempt {tries}): {error}")
+        if tries >= settings.EMAIL_MAX_ATTEMPTS:
+            fields = {"status": "failed", "last_error": error}
+        else:
+            backoff = min(settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (tries - 1), 3600)
+            fields = {"status": "pending", "last_error": error, "next_attempt_at": now + timedelta(seconds=backoff)}
+        updates.append(UpdateOne({"_id": message_id}, {
+            "$set": fields,
+            "$unset": {"lease_until": ""},
+            "$inc": {"attempts": 1},
+        }))
+    await mongodb.db.email_outbox.bulk_write(updates, ordered=False)
+    return len(batch)
+
+async def _dispatch_loop():
+    while True:
+        try:
+            _wakeup.clear()
+            if await dispatch_batch():
+                # Keep draining while there is work
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Email dispatcher error: {e}")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.EMAIL_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
 
-    try:
-        message = MIMEMultipart("alternative")
-        message["Subject"] = subject
-        message["From"] = settings.SENDER_EMAIL
-        message["To"] = to_email
-
-        # HTML body
-        html_part = MIMEText(html_content, "html")
-        message.attach(html_part)
-
-        # Connect to SMTP Server
-        with smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT) as server:
-            server.starttls()
-            server.login(settings.SENDER_EMAIL, settings.SENDER_PASSWORD)
-            server.sendmail(settings.SENDER_EMAIL, to_email, message.as_string())
-            
-        print(f"Email sent successfully to {to_email}")
-
-    except Exception as e:
-        print(f"Failed to send email to {to_email}: {e}")
+async def run_email_dispatcher():
+    """Background task started with the app: one dispatch loop per sender thread."""
+    await asyncio.gather(*[_dispatch_loop() for _ in range(settings.SMTP_SENDERS)])
@@ -0,0 +1,72 @@
+from app.core.config import settings
+from app.core.email_utils import enqueue_email
+from app.core.rollups import record_order_created
+from app.core.events import event_bus, OrderCreated, OrderStatusChanged, StockLow
+
+# Consumers of the order lifecycle events (see app/core/events.py). Each one
+# tracks its own progress, so a new consumer only needs a subscribe here.
+
+def order_confirmation_html(event: OrderCreated) -> str:
+    email_html = f"""
+    <h1>Grazie per il tuo ordine, {event.customer_name}!</h1>
+    <p>Il tuo ordine #{event.order_id} è stato ricevuto ed è {event.status}.</p>
+    <p><strong>Totale:</strong> €{event.total_amount:.2f}</p>
+    <h3>Riepilogo:</h3>
+    <ul>
+    """
+    for item in event.items:
+        email_html += f"<li>{item['quantity']}x {item['name']} - €{item['price']:.2f}</li>"
+    email_html += """
+    </ul>
+    <br>
+    <p>A presto,<br>Il Team di ColleShop</p>
+    """
+    return email_html
+
+def status_email_html(event: OrderStatusChanged) -> str:
+    email_html = f"""
+    <h1>Aggiornamento Ordine #{event.order_id}</h1>
+    <p>Gentile {event.customer_name},</p>
+    <p>Lo stato del tuo ordine è stato aggiornato a: <strong>{event.new_status}</strong></p>
+    """
+
+    if event.new_status == "shipped" and event.tracking_number:
+        email_html += f"""
+        <div style="background-color: #f3f4f6; padding: 15px; border-radius: 5px; margin: 15px 0;">
+            <p style="margin: 0; font-weight: bold;">Dettagli Spedizione:</p>
+            <p style="margin: 5px 0 0 0;">Corriere: {event.courier_name or 'N/D'}</p>
+            <p style="margin: 5px 0 0 0;">Tracking Number: {event.tracking_number}</p>
+        </div>
+        """
+
+    email_html += """
+    <br>
+    <p>Puoi seguire i dettagli nella tua area riservata.</p>
+    <p>A presto,<br>Il Team di ColleShop</p>
+    """
+    return email_html
+
+@event_bus.subscribe("customer_emails", OrderCreated, OrderStatusChanged)
+async def email_customer(event):
+    if not event.customer_email:
+        return
+    if isinstance(event, OrderCreated):
+        await enqueue_email(event.customer_email, f"Conferma Ordine #{event.order_id}", order_confirmation_html(event))
+    elif event.source != "expiry":
+        # Abandoned checkouts are cancelled silently, as before
+        await enqueue_email(event.customer_email, f"Aggiornamento Ordine #{event.order_id}", status_email_html(event))
+
+@event_bus.subscribe("daily_sales", OrderCreated)
+async def count_order(event: OrderCreated):
+    # Events are delivered at least once; the rollup ignores an order it already counted
+    await record_order_created({"_id": event.order_id, "created_at": event.created_at})
+
+@event_bus.subscribe("stock_low_notifications", StockLow)
+async def notify_stock_low(event: StockLow):
+    print(f"Low stock: {event.name} ({event.product_id}) has {event.stock} left")
+    if settings.SENDER_EMAIL:
+        await enqueue_email(
+            settings.SENDER_EMAIL,
+            f"Scorte in esaurimento: {event.name}",
+            f"<p>Restano <strong>{event.stock}</strong> bottiglie di {event.name}.</p>",
+        )
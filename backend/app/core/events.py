@@ -0,0 +1,194 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, ClassVar, Dict, List, Optional, Type
+from bson import ObjectId
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.db.mongodb import mongodb
+
+# Order lifecycle events
+# ----------------------
+# Write paths publish typed events into the `events` collection, in the same
+# transaction as the write when there is one (checkout), so an event exists if
+# and only if the change was committed. Side effects (emails, stock alerts,
+# future rollups) are consumers running in the background, not in the request.
+#
+# Every event lists the consumers that still have to handle it in `pending`;
+# a consumer claims an event with a lease (like the email outbox), handles it
+# and removes itself from `pending`. That per-consumer state is the checkpoint:
+# a restarted or crashed worker resumes exactly where the consumer left off,
+# and several workers can run the same consumer. Failures are retried with
+# backoff, then parked in `failed`.
+#
+# On a replica set a change stream on `events` wakes the consumers as soon as
+# any worker publishes; on a standalone mongod they poll every EVENTS_POLL_SECONDS.
+# The outbox is used instead of change streams on orders/products because
+# events must carry the previous status, which change streams only provide
+# with pre-images enabled.
+#
+# Consumers register with event_bus.subscribe when app.core.event_consumers is
+# imported (main does); events are stored for the consumers known at publish time.
+
+class Event(BaseModel):
+    type: ClassVar[str] = ""
+
+class OrderCreated(Event):
+    type: ClassVar[str] = "OrderCreated"
+    order_id: str
+    user_id: str
+    customer_name: Optional[str] = None
+    customer_email: Optional[str] = None
+    status: str
+    total_amount: float
+    items: List[Dict[str, Any]]
+    created_at: datetime
+
+class OrderStatusChanged(Event):
+    type: ClassVar[str] = "OrderStatusChanged"
+    order_id: str
+    customer_name: Optional[str] = None
+    customer_email: Optional[str] = None
+    old_status: Optional[str] = None
+    new_status: str
+    tracking_number: Optional[str] = None
+    courier_name: Optional[str] = None
+    # "admin" and "bulk" for back-office changes; "expiry" and "payment" come
+    # from the reservation sweeper
+    source: str = "admin"
+
+class StockLow(Event):
+    type: ClassVar[str] = "StockLow"
+    product_id: str
+    name: Optional[str] = None
+    stock: int
+
+EVENT_TYPES: Dict[str, Type[Event]] = {cls.type: cls for cls in (OrderCreated, OrderStatusChanged, StockLow)}
+
+Handler = Callable[[Event], Awaitable[Any]]
+
+class EventBus:
+    def __init__(self):
+        # consumer name -> {event type -> handler}
+        self._consumers: Dict[str, Dict[str, Handler]] = {}
+        self._wakeup = asyncio.Event()
+
+    def subscribe(self, consumer: str, *event_types: Type[Event]):
+        """Decorator registering handler(event) for the given event types under a consumer name."""
+        def register(handler: Handler) -> Handler:
+            for event_type in event_types:
+                self._consumers.setdefault(consumer, {})[event_type.type] = handler
+            return handler
+        return register
+
+    def consumers_of(self, event_type: str) -> List[str]:
+        return [name for name, handlers in self._consumers.items() if event_type in handlers]
+
+    async def publish(self, *events: Event, session=None):
+        """Stores events for their consumers. Pass the session to publish inside a transaction."""
+        now = datetime.utcnow()
+        documents = []
+        for event in events:
+            pending = self.consumers_of(event.type)
+            if pending:
+                documents.append({
+                    "_id": ObjectId(),
+                    "type": event.type,
+                    "payload": event.model_dump(mode="json"),
+                    "pending": pending,
+                    "created_at": now,
+                })
+        if not documents:
+            return
+        await mongodb.db.events.insert_many(documents, session=session)
+        self._wakeup.set()
+
+    async def claim(self, consumer: str) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        lease = f"leases.{consumer}"
+        return await mongodb.db.events.find_one_and_update(
+            {"pending": consumer, "$or": [{lease: {"$exists": False}}, {lease: {"$lte": now}}]},
+            {"$set": {lease: now + timedelta(seconds=settings.EVENTS_LEASE_SECONDS)}},
+            sort=[("_id", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def handle(self, consumer: str, document: Dict[str, Any]):
+        handler = self._consumers[consumer].get(document["type"])
+        lease = f"leases.{consumer}"
+        try:
+            if handler is not None:
+                await handler(EVENT_TYPES[document["type"]](**document["payload"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            tries = document.get("attempts", {}).get(consumer, 0) + 1
+            print(f"Event consumer {consumer} failed on {document['type']} {document['_id']} (attempt {tries}): {e}")
+            if tries >= settings.EVENTS_MAX_ATTEMPTS:
+                update = {"$pull": {"pending": consumer}, "$push": {"failed": consumer}, "$unset": {lease: ""}}
+            else:
+                # The lease doubles as the retry time
+                backoff = min(settings.EVENTS_RETRY_BASE_SECONDS * 2 ** (tries - 1), 3600)
+                update = {"$set": {lease: datetime.utcnow() + timedelta(seconds=backoff)}}
+            update.setdefault("$inc", {})[f"attempts.{consumer}"] = 1
+            await mongodb.db.events.update_one({"_id": document["_id"]}, update)
+            return
+        await mongodb.db.events.update_one(
+            {"_id": document["_id"]},
+            {"$pull": {"pending": consumer}, "$unset": {lease: ""}}
+        )
+
+    async def drain(self, consumer: str) -> int:
+        """Handles every event currently due for the consumer. Returns how many were handled."""
+        handled = 0
+        while True:
+            document = await self.claim(consumer)
+            if document is None:
+                return handled
+            await self.handle(consumer, document)
+            handled += 1
+
+    async def _consume(self, consumer: str, wakeup: asyncio.Event):
+        while True:
+            try:
+                wakeup.clear()
+                await self.drain(consumer)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event consumer {consumer} error: {e}")
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=settings.EVENTS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _watch(self, wakeups: List[asyncio.Event]):
+        """Wakes the consumers when any worker publishes. Needs a replica set."""
+        try:
+            async with mongodb.db.events.watch([{"$match": {"operationType": "insert"}}]) as stream:
+                async for _ in stream:
+                    for wakeup in wakeups:
+                        wakeup.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Events change stream unavailable, polling every {settings.EVENTS_POLL_SECONDS}s: {e}")
+
+    async def _relay(self, wakeups: List[asyncio.Event]):
+        """Fans local publishes out to every consumer loop."""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            for wakeup in wakeups:
+                wakeup.set()
+
+    async def run(self):
+        """Background task started with the app: one loop per consumer."""
+        wakeups = {consumer: asyncio.Event() for consumer in self._consumers}
+        tasks = [self._consume(consumer, wakeup) for consumer, wakeup in wakeups.items()]
+        tasks.append(self._relay(list(wakeups.values())))
+        if mongodb.supports_transactions:
+            tasks.append(self._watch(list(wakeups.values())))
+        await asyncio.gather(*tasks)
+
+event_bus = EventBus()
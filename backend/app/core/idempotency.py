@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.db.mongodb import mongodb
+
+# Idempotency keys
+# ----------------
+# A client sends the same Idempotency-Key header when it retries a request
+# (double click, mobile retry). The first request claims the key with an insert
+# into `idempotency_keys` (unique _id, so only one worker wins) and stores its
+# response there when it succeeds; replays get that response back without
+# running the handler again. Concurrent duplicates wait for the first request:
+# on the same worker through a shared future, on other workers by polling the
+# stored document. Failed requests drop their claim, so a retry runs for real.
+# Duplicates on other workers wait up to the handler's worst-case duration
+# (for checkout: the Stripe deadline plus the database work, unless
+# IDEMPOTENCY_WAIT_SECONDS overrides it), then get a 409 with Retry-After. The
+# claim lease is never shorter than that wait, so a slow but live first request
+# is not taken over and run twice.
+# A TTL index removes keys after IDEMPOTENCY_TTL_HOURS; completed responses are
+# also kept in a small in-memory LRU in front of MongoDB.
+
+class IdempotencyStore:
+    poll_interval = 0.1
+    # Used when neither the caller nor IDEMPOTENCY_WAIT_SECONDS give a wait
+    default_wait_seconds = 10.0
+
+    def __init__(self, cache_size: int):
+        self.cache_size = cache_size
+        self._completed: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def fingerprint(payload: bytes) -> str:
+        return hashlib.sha256(payload).hexdigest()
+
+    def _cached(self, record_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        entry = self._completed.get(record_id)
+        if not entry:
+            return None
+        if time.monotonic() >= entry[2]:
+            self._completed.pop(record_id, None)
+            return None
+        self._completed.move_to_end(record_id)
+        self._check_fingerprint(entry[0], fingerprint)
+        return entry[1]
+
+    def _remember(self, record_id: str, fingerprint: str, response: Dict[str, Any]):
+        expires = time.monotonic() + settings.IDEMPOTENCY_TTL_HOURS * 3600
+        self._completed[record_id] = (fingerprint, response, expires)
+        self._completed.move_to_end(record_id)
+        while len(self._completed) > self.cache_size:
+            self._completed.popitem(last=False)
+
+    @staticmethod
+    def _check_fingerprint(stored: str, fingerprint: str):
+        if stored != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key già usata per una richiesta diversa.",
+            )
+
+    async def _claim(self, record_id: str, fingerprint: str, wait_seconds: float) -> Optional[Dict[str, Any]]:
+        """Claims the key. Returns None when claimed, or the stored document of an earlier request."""
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=max(settings.IDEMPOTENCY_LEASE_SECONDS, wait_seconds))
+        try:
+            await mongodb.db.idempotency_keys.insert_one({
+                "_id": record_id,
+                "status": "in_progress",
+                "fingerprint": fingerprint,
+                "lease_until": lease_until,
+                "created_at": now,
+                "expires_at": now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        # Take over a claim whose owner died without finishing
+        taken = await mongodb.db.idempotency_keys.find_one_and_update(
+            {"_id": record_id, "status": "in_progress", "fingerprint": fingerprint, "lease_until": {"$lte": now}},
+            {"$set": {"lease_until": lease_until}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken:
+            return None
+        existing = await mongodb.db.idempotency_keys.find_one({"_id": record_id})
+        if existing is None:
+            # The first request failed and dropped its claim in the meantime
+            return await self._claim(record_id, fingerprint, wait_seconds)
+        return existing
+
+    async def _wait_for_other_worker(self, record_id: str, fingerprint: str, wait_seconds: float) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + wait_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            existing = await mongodb.db.idempotency_keys.find_one({"_id": record_id}, {"status": 1, "response": 1})
+            if existing is None:
+                return None
+            if existing["status"] == "completed":
+                self._remember(record_id, fingerprint, existing["response"])
+                return existing["response"]
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Una richiesta con la stessa Idempotency-Key è ancora in corso.",
+            headers={"Retry-After": "1"},
+        )
+
+    async def _execute(self, key: str, fingerprint: str, handler, wait_seconds: float) -> tuple:
+        """(response, replayed), or (None, False) when another worker's attempt failed and the key is free again."""
+        existing = await self._claim(key, fingerprint, wait_seconds)
+        if existing is not None:
+            self._check_fingerprint(existing["fingerprint"], fingerprint)
+            if existing["status"] == "completed":
+                self._remember(key, fingerprint, existing["response"])
+                return existing["response"], True
+            response = await self._wait_for_other_worker(key, fingerprint, wait_seconds)
+            return response, response is not None
+
+        try:
+            response = await handler()
+        except BaseException:
+            await mongodb.db.idempotency_keys.delete_one({"_id": key, "status": "in_progress"})
+            raise
+        await mongodb.db.idempotency_keys.update_one(
+            {"_id": key},
+            {"$set": {"status": "completed", "response": response}, "$unset": {"lease_until": ""}},
+        )
+        self._remember(key, fingerprint, response)
+        return response, False
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        handler: Callable[[], Awaitable[Dict[str, Any]]],
+        wait_seconds: Optional[float] = None,
+    ) -> tuple:
+        """
+        Runs handler once per key. Returns (response, replayed).
+        wait_seconds should cover the handler's worst case: it bounds how long a
+        duplicate on another worker waits, and the claim lease is at least as long.
+        """
+        wait_seconds = settings.IDEMPOTENCY_WAIT_SECONDS or wait_seconds or self.default_wait_seconds
+        while True:
+            cached = self._cached(key, fingerprint)
+            if cached is not None:
+                return cached, True
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                outcome = await asyncio.shield(in_flight)
+                if outcome is None:
+                    # The first request failed and dropped its claim: run for real
+                    continue
+                self._check_fingerprint(outcome[0], fingerprint)
+                return outcome[1], True
+
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            result = None
+            try:
+                result = await self._execute(key, fingerprint, handler, wait_seconds)
+            finally:
+                # Waiters on this worker get the response, or None to try themselves
+                future.set_result((fingerprint, result[0]) if result and result[0] is not None else None)
+                del self._in_flight[key]
+            if result[0] is not None:
+                return result
+
+idempotency_store = IdempotencyStore(cache_size=settings.IDEMPOTENCY_CACHE_SIZE)
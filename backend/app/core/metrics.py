@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from pymongo import monitoring
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Request metrics
+# ---------------
+# MetricsMiddleware times every request and records, per route template
+# ("/orders/{id}", not the raw path), latency, request/response sizes and the
+# MongoDB commands the request issued. MongoCommandListener attributes each
+# command to the request that sent it through a context variable (Motor copies
+# the context into its executor threads). Everything is exported in the
+# Prometheus text format on /metrics; requests slower than SLOW_REQUEST_MS are
+# logged as warnings with a per-collection breakdown of their queries.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(labels, le)} {cumulative}")
+            cumulative += values[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route.", LATENCY_BUCKETS)
+REQUEST_SIZE = Histogram("http_request_size_bytes", "Request body size by route.", SIZE_BUCKETS)
+RESPONSE_SIZE = Histogram("http_response_size_bytes", "Response body size by route.", SIZE_BUCKETS)
+REQUEST_MONGO_COMMANDS = Histogram("http_request_mongo_commands", "MongoDB commands issued per request.", COUNT_BUCKETS)
+REQUEST_MONGO_SECONDS = Histogram("http_request_mongo_seconds", "Time spent in MongoDB commands per request.", LATENCY_BUCKETS)
+MONGO_COMMAND_LATENCY = Histogram("mongo_command_duration_seconds", "MongoDB command latency by command and collection.", LATENCY_BUCKETS)
+LOOP_LAG = Histogram("event_loop_lag_seconds", "Delay of a timer callback on the event loop.", LAG_BUCKETS)
+LOOP_LAG_LAST = Gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample.")
+
+REGISTRY = [
+    REQUEST_LATENCY, REQUEST_SIZE, RESPONSE_SIZE, REQUEST_MONGO_COMMANDS, REQUEST_MONGO_SECONDS,
+    MONGO_COMMAND_LATENCY, LOOP_LAG, LOOP_LAG_LAST,
+]
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class RequestStats:
+    def __init__(self):
+        # (command, collection, seconds) in the order they completed
+        self.commands: List[Tuple[str, str, float]] = []
+        self._pending: Dict[int, Tuple[str, str]] = {}
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Records every command's latency and attributes it to the current request, if any."""
+
+    def started(self, event):
+        stats = current_request.get()
+        if stats is not None:
+            collection = event.command.get(event.command_name)
+            stats._pending[event.request_id] = (event.command_name, collection if isinstance(collection, str) else "")
+
+    def _finished(self, event):
+        seconds = event.duration_micros / 1_000_000
+        stats = current_request.get()
+        command, collection = event.command_name, ""
+        if stats is not None:
+            command, collection = stats._pending.pop(event.request_id, (command, collection))
+            stats.commands.append((command, collection, seconds))
+        MONGO_COMMAND_LATENCY.observe(seconds, command=command, collection=collection)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+mongo_command_listener = MongoCommandListener()
+
+def query_breakdown(commands: List[Tuple[str, str, float]]) -> str:
+    per_query: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0])
+    for command, collection, seconds in commands:
+        entry = per_query[(command, collection)]
+        entry[0] += 1
+        entry[1] += seconds
+    ranked = sorted(per_query.items(), key=lambda item: item[1][1], reverse=True)
+    return ", ".join(
+        f"{count}x {command} {collection}".rstrip() + f" {seconds * 1000:.1f}ms"
+        for (command, collection), (count, seconds) in ranked
+    )
+
+def route_template(scope) -> str:
+    """Full template of the matched route, e.g. "/orders/{id}"."""
+    path = getattr(scope.get("route"), "path", None)
+    if path is None:
+        # Unmatched paths share one label so scanners can't blow up the series count
+        return "unmatched"
+    # Routes of included routers keep their prefix-relative path; the prefix
+    # (nested includes already combined) lives on the include context
+    included = (scope.get("fastapi") or {}).get("included_router")
+    prefix = getattr(getattr(included, "include_context", None), "prefix", "")
+    return prefix + path
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses (order export) are measured to the last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        response = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - started
+            self.record(scope, stats, elapsed, response)
+
+    def record(self, scope, stats: RequestStats, elapsed: float, response: Dict[str, int]):
+        path = route_template(scope)
+        method = scope["method"]
+        status = str(response["status"])
+        mongo_seconds = sum(seconds for _, _, seconds in stats.commands)
+
+        REQUEST_LATENCY.observe(elapsed, method=method, route=path, status=status)
+        RESPONSE_SIZE.observe(response["size"], method=method, route=path)
+        headers = dict(scope.get("headers") or [])
+        if b"content-length" in headers:
+            REQUEST_SIZE.observe(int(headers[b"content-length"]), method=method, route=path)
+        REQUEST_MONGO_COMMANDS.observe(len(stats.commands), method=method, route=path)
+        REQUEST_MONGO_SECONDS.observe(mongo_seconds, method=method, route=path)
+
+        if elapsed * 1000 >= settings.SLOW_REQUEST_MS:
+            share = mongo_seconds / elapsed * 100 if elapsed else 0.0
+            logger.warning(
+                "Slow request: %s %s %s %.0fms, %d Mongo commands %.0fms (%.0f%%)%s",
+                method, path, status, elapsed * 1000, len(stats.commands), mongo_seconds * 1000, share,
+                f": {query_breakdown(stats.commands)}" if stats.commands else "",
+            )
+
+async def monitor_event_loop_lag():
+    """Background task: a timer that should fire every interval; how late it fires is the loop lag."""
+    interval = settings.EVENT_LOOP_LAG_INTERVAL_SECONDS
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - scheduled)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class MicroCache:
+    """
+    Short-lived cache for expensive computed payloads.
+    - fresh for `ttl` seconds: served from memory
+    - then stale for `stale_ttl` more seconds: served from memory while one
+      background refresh runs (stale-while-revalidate)
+    - concurrent misses on the same key share one in-flight computation
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[Hashable, Tuple[Any, float, float]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and now < entry[1]:
+            self.stats["hits"] += 1
+            return entry[0]
+        if entry and now < entry[2]:
+            self.stats["stale_hits"] += 1
+            if key not in self._inflight:
+                self._start(key, compute)
+            return entry[0]
+        if key in self._inflight:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            self._start(key, compute)
+        # shield: a cancelled request must not cancel the computation other requests wait on
+        return await asyncio.shield(self._inflight[key])
+
+    def _start(self, key: Hashable, compute: Callable[[], Awaitable[Any]]):
+        task = asyncio.ensure_future(compute())
+        self._inflight[key] = task
+
+        def done(finished: asyncio.Future):
+            self._inflight.pop(key, None)
+            if finished.cancelled():
+                return
+            if finished.exception() is not None:
+                self.stats["errors"] += 1
+                return
+            now = time.monotonic()
+            self._entries[key] = (finished.result(), now + self.ttl, now + self.ttl + self.stale_ttl)
+
+        task.add_done_callback(done)
+
+    def invalidate(self, key: Hashable = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._entries), "inflight": len(self._inflight)}
@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict
+
+# Order export for accounting
+# ---------------------------
+# Orders are streamed straight from a Motor cursor, one row at a time, so memory
+# use doesn't depend on how many orders are exported. Order totals are gross
+# (VAT included, as computed at checkout); the net/VAT split uses the rate stored
+# on the order, or the current site rate for orders placed before it was stored.
+
+EXPORT_BATCH_SIZE = 500
+
+CSV_COLUMNS = [
+    "order_id", "created_at", "status",
+    "customer_name", "customer_email", "customer_tax_code",
+    "billing_street", "billing_city", "billing_province", "billing_zip_code", "billing_country",
+    "items", "vat_rate", "net_amount", "vat_amount", "gross_amount",
+    "stripe_payment_intent_id",
+]
+
+def vat_split(gross: float, vat_rate: float) -> Dict[str, float]:
+    """Splits a VAT-inclusive amount, the inverse of checkout's net * (1 + vat_rate / 100)."""
+    net = round(gross / (1 + vat_rate / 100), 2)
+    return {"net_amount": net, "vat_amount": round(gross - net, 2), "gross_amount": round(gross, 2)}
+
+def export_row(order: Dict[str, Any], default_vat_rate: float) -> Dict[str, Any]:
+    vat_rate = order.get("vat_rate") if order.get("vat_rate") is not None else default_vat_rate
+    billing = order.get("billing_address") or {}
+    created_at = order.get("created_at")
+    row = {
+        "order_id": str(order["_id"]),
+        "created_at": created_at.isoformat() if created_at else None,
+        "status": order.get("status"),
+        "customer_name": order.get("customer_name"),
+        "customer_email": order.get("customer_email"),
+        "customer_tax_code": order.get("customer_tax_code"),
+        "billing_street": billing.get("street"),
+        "billing_city": billing.get("city"),
+        "billing_province": billing.get("province"),
+        "billing_zip_code": billing.get("zip_code"),
+        "billing_country": billing.get("country"),
+        "items": [
+            {"product_id": item.get("product_id"), "name": item.get("name"), "quantity": item.get("quantity"), "price": item.get("price")}
+            for item in order.get("items", [])
+        ],
+        "vat_rate": vat_rate,
+        "stripe_payment_intent_id": order.get("stripe_payment_intent_id"),
+    }
+    row.update(vat_split(order.get("total_amount", 0.0), vat_rate))
+    return row
+
+async def stream_ndjson(cursor, default_vat_rate: float) -> AsyncIterator[bytes]:
+    async for order in cursor:
+        yield (json.dumps(export_row(order, default_vat_rate), ensure_ascii=False) + "\n").encode()
+
+async def stream_csv(cursor, default_vat_rate: float) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+
+    def flush() -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    # BOM so Excel opens accented names correctly
+    yield "\ufeff".encode()
+    writer.writeheader()
+    yield flush()
+    async for order in cursor:
+        row = export_row(order, default_vat_rate)
+        row["items"] = "; ".join(f"{item['quantity']}x {item['name']}" for item in row["items"])
+        writer.writerow(row)
+        yield flush()
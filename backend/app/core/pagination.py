@@ -0,0 +1,76 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException
+
+# Keyset pagination
+# -----------------
+# Lists are sorted on a unique key and the next page starts right after the last
+# document returned, so page N costs the same as page 1 (unlike skip).
+# Cursors are opaque to clients: base64 of the last sort values. The cursor for
+# the following page is sent in the X-Next-Cursor response header, which keeps
+# the response bodies plain JSON arrays.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    payload = {}
+    for key, value in values.items():
+        if isinstance(value, datetime):
+            payload[key] = {"$date": value.isoformat()}
+        else:
+            payload[key] = str(value) if isinstance(value, ObjectId) else value
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *fields: str) -> Dict[str, Any]:
+    """Sort values of a cursor; fields are the keys the list needs besides id. Invalid cursors are a 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = {}
+        for key, value in payload.items():
+            if isinstance(value, dict) and "$date" in value:
+                values[key] = datetime.fromisoformat(value["$date"])
+            else:
+                values[key] = value
+        if not ObjectId.is_valid(values.get("id", "")):
+            raise ValueError("cursor without id")
+        # e.g. a products cursor replayed against orders
+        missing = [field for field in fields if field not in values]
+        if missing:
+            raise ValueError(f"cursor without {', '.join(missing)}")
+        values["id"] = ObjectId(values["id"])
+        return values
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def id_page(query: Dict[str, Any], cursor: Optional[str]) -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+    """Ascending _id order (products)."""
+    if cursor:
+        query = {**query, "_id": {"$gt": decode_cursor(cursor)["id"]}}
+    return query, [("_id", 1)]
+
+def newest_first_page(query: Dict[str, Any], cursor: Optional[str], field: str = "created_at") -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+    """Descending (field, _id) order (orders); _id breaks ties between equal timestamps."""
+    if cursor:
+        last = decode_cursor(cursor, field)
+        after = {"$or": [
+            {field: {"$lt": last[field]}},
+            {field: last[field], "_id": {"$lt": last["id"]}},
+        ]}
+        query = {"$and": [query, after]} if query else after
+    return query, [(field, -1), ("_id", -1)]
+
+def next_cursor(page: List[Dict[str, Any]], limit: int, field: Optional[str] = None) -> Optional[str]:
+    """Cursor for the page after this one, None when this was the last page."""
+    if len(page) < limit:
+        return None
+    last = page[-1]
+    values = {"id": last["_id"]}
+    if field:
+        values[field] = last.get(field)
+    return encode_cursor(values)
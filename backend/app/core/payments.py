@@ -0,0 +1,185 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+import stripe
+from app.core.config import settings
+
+# Payment gateway
+# ---------------
+# The Stripe SDK is synchronous, so calls run on a dedicated thread pool instead
+# of the event loop: a 300-800 ms round trip no longer stalls every other
+# request on the worker. One StripeClient (and its pooled HTTP session) is reused
+# for all calls. Each PaymentIntent is created with an idempotency key derived
+# from the order id, so SDK retries and client retries can never charge twice.
+# After STRIPE_BREAKER_FAILURES consecutive failures the circuit breaker opens and
+# checkouts fail fast with PaymentUnavailable for STRIPE_BREAKER_RESET_SECONDS,
+# then a single trial call decides whether to close it again. Only outages
+# (connection errors, Stripe 5xx, rate limiting, timeouts) count as failures:
+# a rejected request (bad amount, declined card) or a configuration error says
+# nothing about Stripe's health, so it never moves the breaker.
+#
+# STRIPE_API_BASE points the client at another server (e.g. fake_stripe.py).
+
+class PaymentUnavailable(Exception):
+    """Stripe is failing, slow or the breaker is open; the checkout can be retried later."""
+
+class PaymentRejected(Exception):
+    """Stripe refused this request (invalid parameters, declined card); retrying won't help."""
+
+# Errors that mean Stripe itself is unreachable or unhealthy
+OUTAGE_ERRORS = (stripe.APIConnectionError, stripe.APIError, stripe.RateLimitError, asyncio.TimeoutError)
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def release_trial(self):
+        """Frees the half-open trial slot of a call that ended without an outcome (cancelled, unexpected error)."""
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+class PaymentGateway:
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=settings.STRIPE_WORKERS, thread_name_prefix="stripe")
+        self._client: Optional[stripe.StripeClient] = None
+        self.breaker = CircuitBreaker(settings.STRIPE_BREAKER_FAILURES, settings.STRIPE_BREAKER_RESET_SECONDS)
+
+    @property
+    def enabled(self) -> bool:
+        """Real payments need a Stripe test key; without one checkout uses mock intents (dev)."""
+        key = settings.STRIPE_SECRET_KEY
+        if settings.STRIPE_API_BASE:
+            return bool(key)
+        return "sk_test" in key and "placeholder" not in key
+
+    @property
+    def deadline(self) -> float:
+        """Longest a Stripe call can take: every SDK retry timing out, plus slack for waiting on the pool."""
+        return settings.STRIPE_TIMEOUT_SECONDS * (settings.STRIPE_MAX_RETRIES + 1) + 1
+
+    @property
+    def client(self) -> stripe.StripeClient:
+        if self._client is None:
+            options = {}
+            if settings.STRIPE_API_BASE:
+                options["base_addresses"] = {"api": settings.STRIPE_API_BASE}
+            self._client = stripe.StripeClient(
+                settings.STRIPE_SECRET_KEY,
+                http_client=stripe.RequestsClient(timeout=settings.STRIPE_TIMEOUT_SECONDS),
+                max_network_retries=settings.STRIPE_MAX_RETRIES,
+                **options,
+            )
+        return self._client
+
+    def _create_intent(self, amount: int, currency: str, order_id: str):
+        # Newer SDKs group the v1 API under client.v1
+        api = getattr(self.client, "v1", self.client)
+        return api.payment_intents.create(
+            params={
+                "amount": amount,
+                "currency": currency,
+                "automatic_payment_methods": {"enabled": True},
+                "metadata": {"order_id": order_id},
+            },
+            options={"idempotency_key": f"checkout-{order_id}"},
+        )
+
+    async def create_payment_intent(self, amount: int, order_id: str, currency: str = "eur") -> Dict[str, str]:
+        """Creates (or, for a retried order, returns) the order's PaymentIntent: {"id", "client_secret"}."""
+        if not self.enabled:
+            return {"id": "mock_pi_" + order_id, "client_secret": "mock_secret"}
+        if not self.breaker.allow():
+            raise PaymentUnavailable("Pagamenti momentaneamente non disponibili, riprova tra poco.")
+        loop = asyncio.get_running_loop()
+        try:
+            intent = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, self._create_intent, amount, currency, order_id),
+                timeout=self.deadline,
+            )
+        except OUTAGE_ERRORS as e:
+            self.breaker.record_failure()
+            print(f"Stripe error ({self.breaker.state}): {e!r}")
+            raise PaymentUnavailable("Pagamenti momentaneamente non disponibili, riprova tra poco.") from e
+        except (stripe.CardError, stripe.InvalidRequestError) as e:
+            # The request or the customer's card, not Stripe, is the problem
+            raise PaymentRejected(e.user_message or "Pagamento rifiutato.") from e
+        except stripe.StripeError as e:
+            # Authentication, permissions...: our configuration, not an outage
+            print(f"Stripe configuration error: {e!r}")
+            raise PaymentUnavailable("Pagamenti momentaneamente non disponibili, riprova tra poco.") from e
+        finally:
+            # Otherwise a trial ending any other way would keep the breaker half-open forever
+            self.breaker.release_trial()
+        self.breaker.record_success()
+        return {"id": intent.id, "client_secret": intent.client_secret}
+
+    def _retrieve_intent(self, intent_id: str):
+        api = getattr(self.client, "v1", self.client)
+        return api.payment_intents.retrieve(intent_id)
+
+    async def payment_status(self, intent_id: str) -> str:
+        """The PaymentIntent's status (e.g. "succeeded", "processing"). Raises PaymentUnavailable or PaymentRejected."""
+        if not self.enabled or intent_id.startswith("mock_pi_"):
+            # Mock intents are never confirmed
+            return "requires_payment_method"
+        if not self.breaker.allow():
+            raise PaymentUnavailable("Pagamenti momentaneamente non disponibili, riprova tra poco.")
+        loop = asyncio.get_running_loop()
+        try:
+            intent = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, self._retrieve_intent, intent_id),
+                timeout=self.deadline,
+            )
+        except OUTAGE_ERRORS as e:
+            self.breaker.record_failure()
+            print(f"Stripe error ({self.breaker.state}): {e!r}")
+            raise PaymentUnavailable("Pagamenti momentaneamente non disponibili, riprova tra poco.") from e
+        except stripe.InvalidRequestError as e:
+            if e.http_status == 404:
+                # Stripe answered: the intent doesn't exist, so it can't have been paid
+                return "missing"
+            raise PaymentRejected(e.user_message or str(e)) from e
+        except stripe.StripeError as e:
+            print(f"Stripe configuration error: {e!r}")
+            raise PaymentUnavailable("Pagamenti momentaneamente non disponibili, riprova tra poco.") from e
+        finally:
+            self.breaker.release_trial()
+        self.breaker.record_success()
+        return intent.status
+
+payment_gateway = PaymentGateway()
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.db.mongodb import mongodb
+from app.core.settings_cache import settings_cache
+
+# Price book
+# ----------
+# Gross unit prices (net * (1 + VAT/100), rounded to the cent) for every product,
+# kept in memory so a whole cart is priced without touching MongoDB. All money
+# is handled as integer cents computed with Decimal, so the cart page (POST
+# /orders/quote), checkout and the Stripe amount agree to the cent.
+#
+# Product writes on this worker update the book right away (upsert/remove);
+# other workers' writes are picked up when PRICE_BOOK_TTL_SECONDS runs out.
+# Checkout doesn't wait for that: it reads the cart's products anyway (stock)
+# and syncs their current prices into the book before quoting.
+# VAT and shipping come from the settings cache: when its document changes the
+# gross prices are recomputed from the stored net prices, without a reload.
+
+CENT = Decimal("0.01")
+
+def to_cents(amount: Any) -> int:
+    """Euros (float, str or Decimal) to integer cents, rounding half up."""
+    return int((Decimal(str(amount)) / CENT).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def to_euros(cents: int) -> float:
+    return float(Decimal(cents) * CENT)
+
+def gross_cents(net_price: Any, vat_rate: Any) -> int:
+    gross = Decimal(str(net_price)) * (1 + Decimal(str(vat_rate)) / 100)
+    return int((gross / CENT).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+class UnknownProduct(Exception):
+    def __init__(self, product_id: str):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+class PriceBook:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # product id -> {"name", "net": Decimal, "gross_cents": int}
+        self._products: Dict[str, Dict[str, Any]] = {}
+        self._expires_at = 0.0
+        self._settings_document: Optional[Dict[str, Any]] = None
+        self.vat_rate = Decimal("22")
+        self.shipping_cents = 1000
+        self.free_threshold_cents = 10000
+        self._lock = asyncio.Lock()
+
+    def _apply_settings(self, document: Optional[Dict[str, Any]]):
+        values = document or {}
+
+        def setting(name: str, default: float) -> Any:
+            # Saved settings may hold explicit nulls
+            return default if values.get(name) is None else values[name]
+
+        self.vat_rate = Decimal(str(setting("vat_rate", 22.0)))
+        self.shipping_cents = to_cents(setting("shipping_cost", 10.0))
+        self.free_threshold_cents = to_cents(setting("free_shipping_threshold", 100.0))
+        for entry in self._products.values():
+            entry["gross_cents"] = gross_cents(entry["net"], self.vat_rate)
+        self._settings_document = document
+
+    def _entry(self, product: Dict[str, Any]) -> Dict[str, Any]:
+        net = Decimal(str(product.get("price", 0.0)))
+        return {"name": product.get("name"), "net": net, "gross_cents": gross_cents(net, self.vat_rate)}
+
+    async def ensure_fresh(self):
+        document = await settings_cache.get_document()
+        if time.monotonic() >= self._expires_at:
+            async with self._lock:
+                if time.monotonic() >= self._expires_at:
+                    self._apply_settings(document)
+                    products = await mongodb.db.products.find({}, {"name": 1, "price": 1}).to_list(None)
+                    self._products = {str(p["_id"]): self._entry(p) for p in products}
+                    self._expires_at = time.monotonic() + self.ttl
+        # Settings cache refreshed (VAT or shipping may have changed)
+        if document is not self._settings_document:
+            self._apply_settings(document)
+
+    def upsert(self, product: Dict[str, Any]):
+        self._products[str(product["_id"])] = self._entry(product)
+
+    def sync(self, products: List[Dict[str, Any]]):
+        """Upserts products (with name and price) whose entry is missing or outdated, e.g. edited on another worker."""
+        for product in products:
+            entry = self._products.get(str(product["_id"]))
+            if (
+                entry is None
+                or entry["net"] != Decimal(str(product.get("price", 0.0)))
+                or entry["name"] != product.get("name")
+            ):
+                self.upsert(product)
+
+    def remove(self, product_id: Any):
+        self._products.pop(str(product_id), None)
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    def quote(self, quantities: Dict[str, int]) -> Dict[str, Any]:
+        """Prices a cart (product id -> quantity). Raises UnknownProduct. Amounts are in cents."""
+        lines: List[Dict[str, Any]] = []
+        subtotal = 0
+        for product_id, quantity in quantities.items():
+            entry = self._products.get(product_id)
+            if entry is None:
+                raise UnknownProduct(product_id)
+            line_total = entry["gross_cents"] * quantity
+            subtotal += line_total
+            lines.append({
+                "product_id": product_id,
+                "name": entry["name"],
+                "quantity": quantity,
+                "unit_price_cents": entry["gross_cents"],
+                "line_total_cents": line_total,
+            })
+        # Free shipping is decided on the items subtotal
+        shipping = self.shipping_cents if subtotal < self.free_threshold_cents else 0
+        total = subtotal + shipping
+        net_total = int((Decimal(total) / (1 + self.vat_rate / 100)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+        return {
+            "items": lines,
+            "subtotal_cents": subtotal,
+            "shipping_cents": shipping,
+            "total_cents": total,
+            "vat_rate": float(self.vat_rate),
+            "vat_cents": total - net_total,
+        }
+
+price_book = PriceBook(ttl=settings.PRICE_BOOK_TTL_SECONDS)
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Any
+from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from app.core.config import settings
+from app.db.mongodb import mongodb
+from app.core.catalog_cache import catalog_cache
+from app.core.events import event_bus, OrderStatusChanged
+from app.core.payments import payment_gateway, PaymentUnavailable, PaymentRejected
+from app.core.rollups import record_status_change
+
+logger = logging.getLogger(__name__)
+
+# Stock reservations
+# ------------------
+# A checkout decrements stock with a guarded update (stock >= qty) and tags each
+# product with the order id in `stock_holds`. While the order is pending the
+# order document carries `reservation_expires_at`:
+#   - paid/shipped -> commit_reservation(): the tags are dropped, stock stays taken
+#   - cancelled/expired -> release_reservation(): stock goes back exactly once,
+#     because the restore only matches products still tagged with the order id.
+# No global lock is involved, every guard lives in the single-document update.
+# Nothing in the shop confirms payments back to the order yet, so before
+# expiring an order the sweeper asks Stripe: a succeeded intent marks the order
+# paid, a processing one keeps it pending and holding its stock until the next
+# expiry, when Stripe is asked again.
+
+# PaymentIntent statuses that mean the customer has paid (or is paying)
+SETTLED_PAYMENT_STATUSES = ("succeeded", "processing")
+
+def reservation_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+
+def order_quantities(order: Dict[str, Any]) -> Dict[str, int]:
+    """Sums item quantities per product id."""
+    quantities = {}
+    for item in order.get("items", []):
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+    return quantities
+
+async def reserve_stock(order_id: ObjectId, quantities: Dict[str, int], session=None) -> bool:
+    """
+    Decrements stock for every product in a single bulk_write.
+    Each update only matches when enough stock is left, so the check and the
+    decrement are one atomic step. On a partial failure the products that were
+    taken are restored and False is returned. Inside a transaction (session)
+    nothing is restored nor cache-bumped: the caller aborts, or bumps after commit.
+    """
+    operations = [
+        UpdateOne(
+            {"_id": ObjectId(pid), "stock": {"$gte": qty}},
+            {"$inc": {"stock": -qty}, "$push": {"stock_holds": order_id}},
+        )
+        for pid, qty in quantities.items()
+    ]
+    result = await mongodb.db.products.bulk_write(operations, ordered=False, session=session)
+    if session is not None:
+        return result.modified_count == len(operations)
+    catalog_cache.bump()
+    if result.modified_count == len(operations):
+        return True
+
+    # Some line ran out of stock: give back only what this order actually took
+    await release_stock(order_id, quantities)
+    return False
+
+async def release_stock(order_id: ObjectId, quantities: Dict[str, int]):
+    """Restores stock on the products still tagged with order_id."""
+    await mongodb.db.products.bulk_write([
+        UpdateOne(
+            {"_id": ObjectId(pid), "stock_holds": order_id},
+            {"$inc": {"stock": qty}, "$pull": {"stock_holds": order_id}},
+        )
+        for pid, qty in quantities.items()
+    ], ordered=False)
+    catalog_cache.bump()
+
+async def commit_reservation(order: Dict[str, Any]):
+    """The order has been paid: drop the hold tags, the stock stays decremented."""
+    quantities = order_quantities(order)
+    if not quantities:
+        return
+    await mongodb.db.products.update_many(
+        {"_id": {"$in": [ObjectId(pid) for pid in quantities]}},
+        {"$pull": {"stock_holds": order["_id"]}}
+    )
+
+async def release_reservation(order: Dict[str, Any]):
+    """
+    Gives back the stock of a cancelled order.
+    Orders still holding a reservation are restored through their hold tags, so
+    a concurrent cancel and expiry can't restore twice. Orders that were already
+    committed (or created before reservations existed) are restored directly.
+    """
+    quantities = order_quantities(order)
+    if not quantities:
+        return
+    if order.get("reservation_expires_at"):
+        await release_stock(order["_id"], quantities)
+        return
+    await mongodb.db.products.bulk_write([
+        UpdateOne({"_id": ObjectId(pid)}, {"$inc": {"stock": qty}})
+        for pid, qty in quantities.items()
+    ], ordered=False)
+    catalog_cache.bump()
+
+async def release_reservations(orders: List[Dict[str, Any]]):
+    """
+    Batch version of release_reservation for orders the caller has already moved
+    to cancelled with a conditional status update (so each order is released once).
+    Quantities are summed per product: one $inc per SKU, whatever the number of orders.
+    """
+    quantities: Dict[str, int] = {}
+    held_ids: Dict[str, List[ObjectId]] = {}
+    for order in orders:
+        for pid, qty in order_quantities(order).items():
+            quantities[pid] = quantities.get(pid, 0) + qty
+            if order.get("reservation_expires_at"):
+                held_ids.setdefault(pid, []).append(order["_id"])
+    if not quantities:
+        return
+    operations = []
+    for pid, qty in quantities.items():
+        update = {"$inc": {"stock": qty}}
+        if pid in held_ids:
+            update["$pull"] = {"stock_holds": {"$in": held_ids[pid]}}
+        operations.append(UpdateOne({"_id": ObjectId(pid)}, update))
+    await mongodb.db.products.bulk_write(operations, ordered=False)
+    catalog_cache.bump()
+
+async def commit_reservations(orders: List[Dict[str, Any]]):
+    """Batch version of commit_reservation."""
+    held = [order for order in orders if order.get("reservation_expires_at")]
+    product_ids = {pid for order in held for pid in order_quantities(order)}
+    if not product_ids:
+        return
+    await mongodb.db.products.update_many(
+        {"_id": {"$in": [ObjectId(pid) for pid in product_ids]}},
+        {"$pull": {"stock_holds": {"$in": [order["_id"] for order in held]}}}
+    )
+
+async def settle_paid_order(order_id: ObjectId, payment_status: str) -> bool:
+    """
+    Acts on a pending order whose payment went through or is going through.
+    succeeded: the order is paid and its reservation committed. processing: the
+    hold is kept and its expiry pushed forward, so a later sweep asks Stripe again
+    and a payment that ends up failing still gets its stock released.
+    """
+    if payment_status == "processing":
+        result = await mongodb.db.orders.update_one(
+            {"_id": order_id, "status": "pending", "reservation_expires_at": {"$exists": True}},
+            {"$set": {"reservation_expires_at": reservation_expiry()}}
+        )
+        return result.modified_count == 1
+    order = await mongodb.db.orders.find_one_and_update(
+        {"_id": order_id, "status": "pending", "reservation_expires_at": {"$exists": True}},
+        {"$set": {"status": "paid"}, "$unset": {"reservation_expires_at": ""}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not order:
+        return False
+    await commit_reservation(order)
+    await record_status_change(order, "paid")
+    await event_bus.publish(OrderStatusChanged(
+        order_id=str(order["_id"]),
+        customer_name=order.get("customer_name"),
+        customer_email=order.get("customer_email"),
+        old_status="pending",
+        new_status="paid",
+        source="payment",
+    ))
+    return True
+
+async def expire_reservations(limit: int = 100) -> int:
+    """Cancels unpaid pending orders whose reservation has expired and releases their stock."""
+    now = datetime.utcnow()
+    expired: List[Dict[str, Any]] = await mongodb.db.orders.find(
+        {"status": "pending", "reservation_expires_at": {"$lte": now}},
+        {"_id": 1, "stripe_payment_intent_id": 1}
+    ).to_list(limit)
+
+    released = 0
+    for candidate in expired:
+        intent_id = candidate.get("stripe_payment_intent_id")
+        if intent_id:
+            try:
+                payment_status = await payment_gateway.payment_status(intent_id)
+            except (PaymentUnavailable, PaymentRejected) as e:
+                # Can't tell whether it was paid: never cancel blindly, try next sweep
+                logger.warning("Payment status of order %s unknown: %s", candidate["_id"], e)
+                continue
+            if payment_status in SETTLED_PAYMENT_STATUSES:
+                if await settle_paid_order(candidate["_id"], payment_status):
+                    logger.info("Order %s payment %s, reservation %s", candidate["_id"], payment_status,
+                                "committed" if payment_status == "succeeded" else "extended")
+                continue
+
+        # Claim the order with a conditional transition so only one worker releases it
+        order = await mongodb.db.orders.find_one_and_update(
+            {"_id": candidate["_id"], "status": "pending", "reservation_expires_at": {"$lte": now}},
+            {"$set": {"status": "cancelled"}, "$unset": {"reservation_expires_at": ""}},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if order:
+            await release_reservation(order)
+            await event_bus.publish(OrderStatusChanged(
+                order_id=str(order["_id"]),
+                customer_name=order.get("customer_name"),
+                customer_email=order.get("customer_email"),
+                old_status="pending",
+                new_status="cancelled",
+                source="expiry",
+            ))
+            released += 1
+    return released
+
+async def run_reservation_sweeper():
+    """Background loop started with the app; releases stock of abandoned checkouts."""
+    while True:
+        try:
+            released = await expire_reservations()
+            if released:
+                logger.info("Released stock for %d expired pending orders", released)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Reservation sweeper error")
+        await asyncio.sleep(settings.RESERVATION_SWEEP_SECONDS)
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.db.mongodb import mongodb
+
+# Daily sales rollups
+# -------------------
+# One `daily_sales` document per day (keyed "YYYY-MM-DD" on the order's
+# created_at, like the dashboard chart always did):
+#   orders       -> orders placed that day, whatever their status
+#   order_ids    -> their ids (as strings), so a redelivered event isn't counted twice
+#   paid_orders  -> orders currently counted as revenue (paid or shipped)
+#   revenue      -> sum of total_amount of those orders
+#   units.<id>   -> bottles sold per product
+# The counters are updated incrementally on every status transition, so the
+# dashboard reads one document per day instead of scanning all orders.
+# New orders are counted by an OrderCreated consumer (app/core/event_consumers.py),
+# outside the checkout transaction, so checkouts don't conflict on today's document.
+# rebuild_rollups() recomputes everything from the orders collection.
+
+REVENUE_STATUSES = ("paid", "shipped")
+
+def day_key(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+def day_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+async def record_order_created(order: Dict[str, Any]):
+    """Counts a new order once, however many times it is delivered."""
+    created_at = order["created_at"]
+    order_id = str(order["_id"])
+    try:
+        # The filter and the $inc are one single-document update: once the id
+        # is listed, the update can't match again
+        await mongodb.db.daily_sales.update_one(
+            {"_id": day_key(created_at), "order_ids": {"$ne": order_id}},
+            {"$inc": {"orders": 1}, "$push": {"order_ids": order_id}, "$setOnInsert": {"date": day_start(created_at)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The day exists and already lists the order: the upsert tried to insert it again
+        pass
+
+def revenue_delta(order: Dict[str, Any], sign: int) -> Dict[str, Any]:
+    inc = {
+        "revenue": sign * order.get("total_amount", 0.0),
+        "paid_orders": sign,
+    }
+    for item in order.get("items", []):
+        key = f"units.{item['product_id']}"
+        inc[key] = inc.get(key, 0) + sign * item["quantity"]
+    return inc
+
+async def record_status_change(order: Dict[str, Any], new_status: str):
+    """Adds or removes the order's revenue when it enters or leaves paid/shipped."""
+    await record_status_changes([(order, new_status)])
+
+async def record_status_changes(changes: List[Tuple[Dict[str, Any], str]]):
+    """Applies several (order, new status) transitions with one upsert per day touched."""
+    per_day: Dict[str, Dict[str, Any]] = {}
+    for order, new_status in changes:
+        was_revenue = order.get("status") in REVENUE_STATUSES
+        is_revenue = new_status in REVENUE_STATUSES
+        if was_revenue == is_revenue or not order.get("created_at"):
+            continue
+        key = day_key(order["created_at"])
+        day = per_day.setdefault(key, {"date": day_start(order["created_at"]), "inc": {}})
+        for field, value in revenue_delta(order, 1 if is_revenue else -1).items():
+            day["inc"][field] = day["inc"].get(field, 0) + value
+    if not per_day:
+        return
+    await mongodb.db.daily_sales.bulk_write([
+        UpdateOne({"_id": key}, {"$inc": day["inc"], "$setOnInsert": {"date": day["date"]}}, upsert=True)
+        for key, day in per_day.items()
+    ], ordered=False)
+
+async def get_daily_sales(days: int, db=None) -> List[Dict[str, Any]]:
+    """Rollups of the last `days` days (today included), oldest first."""
+    db = db if db is not None else mongodb.analytics_db
+    since = day_start(datetime.utcnow() - timedelta(days=days - 1))
+    return await db.daily_sales.find({"date": {"$gte": since}}, {"order_ids": 0}).sort("date", 1).to_list(days)
+
+async def get_total_revenue(db=None) -> float:
+    db = db if db is not None else mongodb.analytics_db
+    result = await db.daily_sales.aggregate([
+        {"$group": {"_id": None, "total": {"$sum": "$revenue"}}}
+    ]).to_list(1)
+    return result[0]["total"] if result else 0.0
+
+async def rebuild_rollups() -> int:
+    """Recomputes every daily rollup from the orders collection. Returns the number of days written."""
+    day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}
+    rollups: Dict[str, Dict[str, Any]] = {}
+
+    def rollup(key: str) -> Dict[str, Any]:
+        if key not in rollups:
+            rollups[key] = {
+                "_id": key,
+                "date": datetime.strptime(key, "%Y-%m-%d"),
+                "orders": 0,
+                "order_ids": [],
+                "paid_orders": 0,
+                "revenue": 0.0,
+                "units": {},
+            }
+        return rollups[key]
+
+    async for entry in mongodb.db.orders.aggregate([
+        {"$match": {"created_at": {"$type": "date"}}},
+        {"$group": {"_id": day, "orders": {"$sum": 1}, "order_ids": {"$push": {"$toString": "$_id"}}}},
+    ]):
+        target = rollup(entry["_id"])
+        target["orders"] = entry["orders"]
+        target["order_ids"] = entry["order_ids"]
+
+    async for entry in mongodb.db.orders.aggregate([
+        {"$match": {"status": {"$in": list(REVENUE_STATUSES)}, "created_at": {"$type": "date"}}},
+        {"$group": {"_id": day, "revenue": {"$sum": "$total_amount"}, "paid_orders": {"$sum": 1}}},
+    ]):
+        target = rollup(entry["_id"])
+        target["revenue"] = entry["revenue"]
+        target["paid_orders"] = entry["paid_orders"]
+
+    async for entry in mongodb.db.orders.aggregate([
+        {"$match": {"status": {"$in": list(REVENUE_STATUSES)}, "created_at": {"$type": "date"}}},
+        {"$unwind": "$items"},
+        {"$group": {"_id": {"day": day, "product_id": "$items.product_id"}, "units": {"$sum": "$items.quantity"}}},
+    ]):
+        rollup(entry["_id"]["day"])["units"][entry["_id"]["product_id"]] = entry["units"]
+
+    await mongodb.db.daily_sales.delete_many({"_id": {"$nin": list(rollups)}})
+    if rollups:
+        await mongodb.db.daily_sales.bulk_write(
+            [ReplaceOne({"_id": key}, doc, upsert=True) for key, doc in rollups.items()],
+            ordered=False
+        )
+    return len(rollups)
@@ -0,0 +1,166 @@
+import asyncio
+import bisect
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Set
+from app.core.config import settings
+from app.db.mongodb import mongodb
+
+# In-process catalog search index
+# -------------------------------
+# Inverted index token -> {product id: weight} over the same fields (and weights)
+# as the Mongo text index. Unlike $text it matches prefixes ("tin" -> tintilia)
+# and tolerates one typo ("falangina" -> falanghina). It is built from the
+# products collection on first use; the product routes keep it up to date
+# (upsert/remove) for writes on this worker, and it is rebuilt every
+# SEARCH_INDEX_TTL_SECONDS to pick up other workers' writes. After the first
+# build, rebuilds run as a background task that fills a new index and swaps it
+# in, so searches don't wait for them and keep using the old one meanwhile.
+
+FIELD_WEIGHTS = {"name": 10, "grape": 5, "pairing": 2, "description": 1}
+MIN_FUZZY_LENGTH = 4
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in re.findall(r"[a-z0-9]+", normalize(text)) if len(token) > 1]
+
+def within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by at most one insertion, deletion or substitution."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+        else:
+            i += 1
+        j += 1
+    return edits + (len(b) - j) <= 1
+
+class SearchIndex:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._tokens_by_product: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._expires_at = 0.0
+        self._built = False
+        self._refresh: Optional[asyncio.Task] = None
+        # Local writes made while a rebuild reads the collection, replayed after the swap
+        self._writes_during_rebuild: Optional[List[tuple]] = None
+        self._lock = asyncio.Lock()
+
+    async def ensure_built(self):
+        if time.monotonic() < self._expires_at:
+            return
+        if self._built:
+            # Searches keep using the current index while it is rebuilt in the background
+            if self._refresh is None or self._refresh.done():
+                self._refresh = asyncio.create_task(self._refresh_in_background())
+            return
+        # First build: there is nothing to search yet, so callers wait for it
+        async with self._lock:
+            if not self._built:
+                await self._rebuild()
+
+    async def _refresh_in_background(self):
+        try:
+            await self._rebuild()
+        except Exception as e:
+            # The current index stays in use; the next search retries
+            print(f"Search index rebuild failed: {e}")
+
+    async def _rebuild(self):
+        fresh = SearchIndex(self.ttl)
+        self._writes_during_rebuild = []
+        try:
+            fields = {field: 1 for field in FIELD_WEIGHTS}
+            async for product in mongodb.db.products.find({}, fields):
+                fresh.upsert(product)
+            writes = self._writes_during_rebuild
+        finally:
+            self._writes_during_rebuild = None
+        self._postings = fresh._postings
+        self._tokens_by_product = fresh._tokens_by_product
+        self._vocabulary = fresh._vocabulary
+        for method, argument in writes:
+            getattr(self, method)(argument)
+        self._built = True
+        self._expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    def upsert(self, product: Dict[str, Any]):
+        if self._writes_during_rebuild is not None:
+            self._writes_during_rebuild.append(("upsert", product))
+        product_id = str(product["_id"])
+        self._remove(product_id)
+        weights: Dict[str, int] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field) or ""):
+                weights[token] = weights.get(token, 0) + weight
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._postings[token] = {}
+                bisect.insort(self._vocabulary, token)
+            self._postings[token][product_id] = weight
+        self._tokens_by_product[product_id] = set(weights)
+
+    def remove(self, product_id: Any):
+        if self._writes_during_rebuild is not None:
+            self._writes_during_rebuild.append(("remove", product_id))
+        self._remove(str(product_id))
+
+    def _remove(self, product_id: str):
+        for token in self._tokens_by_product.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary.pop(bisect.bisect_left(self._vocabulary, token))
+
+    def _expand(self, term: str) -> Dict[str, float]:
+        """Vocabulary tokens matching a query term, with a match quality factor."""
+        matches = {}
+        start = bisect.bisect_left(self._vocabulary, term)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            matches[token] = 1.0 if token == term else 0.8
+        if not matches and len(term) >= MIN_FUZZY_LENGTH:
+            for token in self._vocabulary:
+                if within_one_edit(term, token) or within_one_edit(term, token[:len(term)]):
+                    matches[token] = 0.5
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Product ids matching every query term, best first."""
+        scores: Optional[Dict[str, float]] = None
+        for term in tokenize(query):
+            term_scores: Dict[str, float] = {}
+            for token, quality in self._expand(term).items():
+                for product_id, weight in self._postings[token].items():
+                    term_scores[product_id] = max(term_scores.get(product_id, 0.0), weight * quality)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {pid: score + term_scores[pid] for pid, score in scores.items() if pid in term_scores}
+            if not scores:
+                return []
+        ranked = sorted((scores or {}).items(), key=lambda entry: entry[1], reverse=True)
+        return [product_id for product_id, _ in ranked[:limit]]
+
+search_index = SearchIndex(ttl=settings.SEARCH_INDEX_TTL_SECONDS)
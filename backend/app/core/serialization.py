@@ -0,0 +1,91 @@
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, get_args, get_origin
+import orjson
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from bson import ObjectId
+from app.core.config import settings
+
+# Fast-path JSON responses
+# ------------------------
+# Documents are validated by the Pydantic models when they are written
+# (ProductCreate, OrderCreate, ...), so list endpoints don't validate them again
+# on the way out: documents are trimmed to the response model's fields and
+# encoded with orjson. The output matches what FastAPI's response_model would
+# produce (aliased keys such as "_id", defaults for missing fields, extra fields
+# dropped). STRICT_RESPONSE_VALIDATION=true goes through the models instead,
+# which is useful in tests to catch documents that drifted from the schema.
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_default)
+
+def _nested_model(annotation: Any) -> Tuple[Optional[Type[BaseModel]], bool]:
+    """(model, is_list) when a field holds a sub-model such as Address or List[OrderItem]."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    args = [arg for arg in get_args(annotation) if arg is not type(None)]
+    if get_origin(annotation) in (list, List) and args:
+        model, _ = _nested_model(args[0])
+        return model, True
+    if len(args) == 1:
+        return _nested_model(args[0])
+    return None, False
+
+def _response_fields(model: Type[BaseModel]) -> List[tuple]:
+    """(key, default, nested model, is_list) for every field of the model."""
+    fields = []
+    for name, field in model.model_fields.items():
+        key = field.alias or name
+        # Factory defaults (e.g. created_at=utcnow) only matter for new documents
+        default = None if field.is_required() or field.default_factory else field.default
+        nested, is_list = _nested_model(field.annotation)
+        fields.append((key, default, nested, is_list))
+    return fields
+
+_fields_cache: Dict[Type[BaseModel], List[tuple]] = {}
+
+def shape(document: Dict[str, Any], model: Type[BaseModel]) -> Dict[str, Any]:
+    """Trims a document to the model's fields, filling defaults like the model would."""
+    fields = _fields_cache.get(model)
+    if fields is None:
+        fields = _fields_cache[model] = _response_fields(model)
+    shaped = {}
+    for key, default, nested, is_list in fields:
+        value = document.get(key, default)
+        if nested is not None and value is not None:
+            value = [shape(entry, nested) for entry in value] if is_list else shape(value, nested)
+        shaped[key] = value
+    return shaped
+
+def projection(model: Type[BaseModel], computed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Mongo projection fetching only the model's fields (plus computed expressions)."""
+    fields = _fields_cache.get(model)
+    if fields is None:
+        fields = _fields_cache[model] = _response_fields(model)
+    spec: Dict[str, Any] = {key: 1 for key, *_ in fields}
+    spec.update(computed or {})
+    return spec
+
+def serialize_documents(documents: Iterable[Dict[str, Any]], model: Type[BaseModel]) -> bytes:
+    """JSON array of documents shaped like List[model]."""
+    if settings.STRICT_RESPONSE_VALIDATION:
+        adapter = TypeAdapter(List[model])
+        return adapter.dump_json(adapter.validate_python(list(documents)), by_alias=True)
+    return dumps([shape(document, model) for document in documents])
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
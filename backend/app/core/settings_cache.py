@@ -0,0 +1,68 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.db.mongodb import mongodb
+from app.models.settings import SiteSettings
+
+class SettingsCache:
+    """
+    Keeps the site settings document in memory for SETTINGS_CACHE_TTL_SECONDS.
+    update_settings invalidates it right away in the current worker; other
+    workers pick the change up through watch_settings_changes or, at the
+    latest, when the TTL runs out.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._document: Optional[Dict[str, Any]] = None
+        self._expires_at = 0.0
+        # Bumped by invalidate(); a refresh started before an invalidation isn't cached
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def get_document(self) -> Optional[Dict[str, Any]]:
+        """Returns the raw settings document (None if it was never saved)."""
+        if time.monotonic() < self._expires_at:
+            return self._document
+        async with self._lock:
+            # Another request may have refreshed it while we were waiting
+            if time.monotonic() < self._expires_at:
+                return self._document
+            generation = self._generation
+            document = await mongodb.db.settings.find_one({})
+            if generation == self._generation:
+                self._document = document
+                self._expires_at = time.monotonic() + self.ttl
+            # Otherwise the read may predate the change: the next call reads again
+            return document
+
+    async def get(self) -> SiteSettings:
+        document = await self.get_document()
+        if not document:
+            return SiteSettings()
+        return SiteSettings(**document, id=str(document["_id"]))
+
+    def invalidate(self):
+        """Drops the cached document, including a refresh still in flight."""
+        self._generation += 1
+        self._expires_at = 0.0
+        self._document = None
+
+settings_cache = SettingsCache(ttl=settings.SETTINGS_CACHE_TTL_SECONDS)
+
+async def watch_settings_changes():
+    """
+    Cross-worker invalidation through a change stream on the settings collection.
+    Needs a replica set; on a standalone mongod the TTL is the only bound.
+    """
+    while True:
+        try:
+            async with mongodb.db.settings.watch() as stream:
+                async for _ in stream:
+                    settings_cache.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Settings change stream unavailable, relying on TTL: {e}")
+            return
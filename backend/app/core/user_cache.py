@@ -0,0 +1,42 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from app.core.config import settings
+
+class UserCache:
+    """
+    Bounded LRU of user documents keyed by user id, used by get_current_user.
+    Entries expire after `ttl` seconds, which also bounds how long a change made
+    by another worker (or a script) goes unnoticed. Writes to a user in this
+    process should call invalidate().
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if not entry:
+            return None
+        if time.monotonic() >= entry[1]:
+            self._entries.pop(user_id, None)
+            return None
+        self._entries.move_to_end(user_id)
+        # Shallow copy so a handler can't alter the cached principal
+        return dict(entry[0])
+
+    def set(self, user_id: str, user: Dict[str, Any]):
+        self._entries[user_id] = (dict(user), time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: Any):
+        self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        self._entries.clear()
+
+user_cache = UserCache(max_size=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
@@ -0,0 +1,109 @@
+from datetime import datetime
+from typing import Dict, List
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+from app.core.config import settings
+
+# Index registry
+# --------------
+# Every collection declares the indexes its queries rely on. ensure_indexes()
+# runs at startup and is idempotent: existing indexes with the same name and
+# spec are left alone. Use `python manage_indexes.py` to report missing or
+# unused indexes and to check that the route queries below are index-covered.
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # Login, register and forgot-password look users up by email
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # Only users with a pending password reset carry a token
+        IndexModel([("reset_token", ASCENDING)], name="reset_token", sparse=True),
+    ],
+    "orders": [
+        # /orders/mine and the user dashboard, newest first
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created"),
+        # Admin order list, recent orders widget and keyset pagination
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created"),
+        # Status filter (keyset pages sort on created_at, _id) and revenue aggregations
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="status_created_id"),
+        # Admin filter by customer email, same page order
+        IndexModel([("customer_email", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="customer_email_created_id"),
+        # Reservation sweeper: only pending orders carry an expiry
+        IndexModel([("reservation_expires_at", ASCENDING)], name="reservation_expires_at", sparse=True),
+    ],
+    "products": [
+        # Low stock widget and in_stock filter
+        IndexModel([("stock", ASCENDING)], name="stock"),
+        # Catalog filter by type
+        IndexModel([("type", ASCENDING), ("_id", ASCENDING)], name="type"),
+        # /products/search relevance (same weights as the in-process search index)
+        IndexModel(
+            [("name", TEXT), ("grape", TEXT), ("description", TEXT), ("pairing", TEXT)],
+            name="catalog_text",
+            weights={"name": 10, "grape": 5, "pairing": 2, "description": 1},
+            default_language="italian",
+        ),
+    ],
+    "email_outbox": [
+        # Dispatcher claims due messages and expired sender leases
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease", sparse=True),
+        # Only sent messages carry sent_at; they are dropped after EMAIL_RETENTION_DAYS
+        IndexModel([("sent_at", ASCENDING)], name="sent_at_ttl", expireAfterSeconds=settings.EMAIL_RETENTION_DAYS * 86400),
+    ],
+    "events": [
+        # Consumers claim their oldest pending event
+        IndexModel([("pending", ASCENDING), ("_id", ASCENDING)], name="pending"),
+        # Handled events are kept EVENTS_RETENTION_DAYS for inspection
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=settings.EVENTS_RETENTION_DAYS * 86400),
+    ],
+    "idempotency_keys": [
+        # Keys are dropped IDEMPOTENCY_TTL_HOURS after the first request
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "daily_sales": [
+        # Dashboard chart ranges
+        IndexModel([("date", ASCENDING)], name="date"),
+    ],
+}
+
+# Indexes replaced by a declared one; ensure_indexes() drops them once the
+# replacement exists
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    "orders": ["status_created", "customer_email_created"],
+}
+
+# Representative route queries as (collection, filter, sort), checked with explain
+ROUTE_QUERIES = [
+    ("users", {"email": "someone@example.com"}, None),
+    ("users", {"reset_token": "token"}, None),
+    ("orders", {"user_id": "000000000000000000000000"}, [("created_at", -1), ("_id", -1)]),
+    ("orders", {}, [("created_at", -1), ("_id", -1)]),
+    ("orders", {"status": {"$in": ["paid", "shipped"]}, "created_at": {"$gte": datetime(2000, 1, 1)}}, None),
+    ("orders", {"status": "paid"}, [("created_at", -1), ("_id", -1)]),
+    ("orders", {"customer_email": "someone@example.com"}, [("created_at", -1), ("_id", -1)]),
+    ("orders", {"status": "pending", "reservation_expires_at": {"$lte": datetime(2000, 1, 1)}}, None),
+    ("products", {"stock": {"$lte": 5}}, None),
+    ("products", {"type": "Rosso"}, [("_id", 1)]),
+    ("events", {"pending": "customer_emails"}, [("_id", 1)]),
+]
+
+async def ensure_indexes(db):
+    """Creates the registered indexes. Failures are reported per collection and don't stop startup."""
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            print(f"Could not create indexes on {collection}: {e}")
+            continue
+        existing = await db[collection].index_information()
+        for name in RETIRED_INDEXES.get(collection, []):
+            if name not in existing:
+                continue
+            try:
+                await db[collection].drop_index(name)
+            except OperationFailure as e:
+                # 27 IndexNotFound: another worker starting up dropped it first
+                if e.code != 27:
+                    print(f"Could not drop retired index {collection}.{name}: {e}")
+                continue
+            print(f"Dropped retired index {collection}.{name}")
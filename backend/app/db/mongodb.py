@@ -1,18 +1,118 @@
 
+import asyncio
+from collections import defaultdict
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
 from app.core.config import settings
+from app.core.metrics import mongo_command_listener
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Tracks connections checked out per server so readiness can report pool saturation."""
+
+    def __init__(self):
+        self.checked_out = defaultdict(int)
+        self.wait_timeouts = 0
+
+    def connection_checked_out(self, event):
+        self.checked_out[event.address] += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out[event.address] = max(0, self.checked_out[event.address] - 1)
+
+    def connection_check_out_failed(self, event):
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            self.wait_timeouts += 1
+
+    def pool_cleared(self, event):
+        self.checked_out[event.address] = 0
+
+    def pool_closed(self, event):
+        self.checked_out.pop(event.address, None)
+
+    # Events we don't need
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def snapshot(self):
+        busiest = max(self.checked_out.values(), default=0)
+        return {
+            "checked_out": sum(self.checked_out.values()),
+            "max_pool_size": settings.MONGO_MAX_POOL_SIZE,
+            # Per server, since each server has its own pool
+            "saturation": round(busiest / settings.MONGO_MAX_POOL_SIZE, 3) if settings.MONGO_MAX_POOL_SIZE else 0.0,
+            "wait_queue_timeouts": self.wait_timeouts,
+        }
+
+def read_preference(name: str, max_staleness: int = -1):
+    mode = read_pref_mode_from_name(name)
+    # Primary reads are never stale, so the driver rejects maxStalenessSeconds for them
+    return make_read_preference(mode, None, max_staleness if mode else -1)
+
+# Read workloads
+# --------------
+# Every handle points at the same database; only the read preference differs.
+# Writes always go to the primary whatever the handle, so "catalog" and
+# "analytics" are only for reads that tolerate replication lag (listings,
+# search, dashboard aggregations). Read-your-writes paths such as checkout and
+# order status changes use mongodb.db.
+WORKLOADS = ("primary", "catalog", "analytics")
 
 class MongoDB:
     client: AsyncIOMotorClient = None
     db = None
+    # Same database, read preference for catalog listings and search
+    catalog_db = None
+    # Same database, read preference for heavy analytics reads
+    analytics_db = None
+    # Multi-document transactions need a replica set or a sharded cluster
+    supports_transactions = False
+    pool_stats = PoolStats()
+
+    def get_db(self, workload: str = "primary"):
+        if workload not in WORKLOADS:
+            raise ValueError(f"Unknown read workload: {workload}")
+        return {"primary": self.db, "catalog": self.catalog_db, "analytics": self.analytics_db}[workload]
+
+    def client_options(self) -> dict:
+        options = {
+            "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+            "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+            "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+            "event_listeners": [self.pool_stats, mongo_command_listener],
+        }
+        if settings.MONGO_COMPRESSORS:
+            options["compressors"] = settings.MONGO_COMPRESSORS
+        return options
 
     async def connect_to_database(self):
+        """Connects and pings the server; raises if MongoDB can't be reached so startup fails fast."""
+        self.client = AsyncIOMotorClient(settings.MONGO_URI, **self.client_options())
+        self.db = self.client.get_default_database()
+        self.catalog_db = self.client.get_default_database(
+            read_preference=read_preference(settings.MONGO_CATALOG_READ_PREFERENCE, settings.MONGO_MAX_STALENESS_SECONDS)
+        )
+        self.analytics_db = self.client.get_default_database(
+            read_preference=read_preference(settings.MONGO_ANALYTICS_READ_PREFERENCE, settings.MONGO_MAX_STALENESS_SECONDS)
+        )
         try:
-            self.client = AsyncIOMotorClient(settings.MONGO_URI)
-            self.db = self.client.get_default_database()
-            print("Connected to MongoDB")
+            await self.ping()
         except Exception as e:
-            print(f"Could not connect to MongoDB: {e}")
+            self.client.close()
+            self.client = None
+            raise RuntimeError(f"Could not connect to MongoDB: {e}") from e
+        hello = await self.client.admin.command("hello")
+        self.supports_transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        print(f"Connected to MongoDB (transactions {'enabled' if self.supports_transactions else 'unavailable: standalone server'})")
+
+    async def ping(self, timeout: float = None):
+        await asyncio.wait_for(self.client.admin.command("ping"), timeout=timeout)
 
     async def close_database_connection(self):
         if self.client:
@@ -20,3 +120,12 @@ class MongoDB:
             print("MongoDB connection closed")
 
 mongodb = MongoDB()
+
+def reads_from(workload: str):
+    """Dependency giving a route the database handle for a read workload: db = Depends(reads_from("catalog"))."""
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unknown read workload: {workload}")
+
+    def dependency():
+        return mongodb.get_db(workload)
+    return dependency
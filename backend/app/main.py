@@ -1,10 +1,24 @@
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core.config import settings as settings_config
+import asyncio
+import logging
+import time
 from app.db.mongodb import mongodb
+from app.db.indexes import ensure_indexes
+from app.core.reservations import run_reservation_sweeper
+from app.core.settings_cache import watch_settings_changes
+from app.core.email_utils import run_email_dispatcher
+from app.core.events import event_bus
+from app.core import event_consumers  # noqa: F401 (registers the event consumers)
+from app.core.payments import payment_gateway
+from app.core.metrics import MetricsMiddleware, monitor_event_loop_lag, render_metrics
 from app.routes import auth, products, orders, analytics, settings
 
+logging.basicConfig(level=logging.INFO)
+
 app = FastAPI(title=settings_config.PROJECT_NAME)
 
 # CORS Configuration
@@ -14,8 +28,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the storefront read the pagination cursor, catalog ETag and checkout replays
+    expose_headers=["X-Next-Cursor", "ETag", "Idempotent-Replayed"],
 )
 
+# Outermost, so the timings include CORS handling
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(products.router, prefix="/products", tags=["products"])
 app.include_router(orders.router, prefix="/orders", tags=["orders"])
@@ -25,15 +44,47 @@ app.include_router(settings.router, prefix="/settings", tags=["settings"])
 @app.on_event("startup")
 async def startup_db_client():
     await mongodb.connect_to_database()
+    await ensure_indexes(mongodb.db)
+    app.state.background_tasks = [
+        asyncio.create_task(run_reservation_sweeper()),
+        asyncio.create_task(run_email_dispatcher()),
+        asyncio.create_task(event_bus.run()),
+        asyncio.create_task(monitor_event_loop_lag()),
+    ]
+    if settings_config.SETTINGS_CACHE_WATCH:
+        app.state.background_tasks.append(asyncio.create_task(watch_settings_changes()))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in app.state.background_tasks:
+        task.cancel()
     await mongodb.close_database_connection()
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to ColleShop API"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live")
+async def liveness_check():
+    # The process is up and serving; MongoDB problems are the readiness probe's business
+    return {"status": "ok"}
+
+@app.get("/health/ready")
 @app.get("/health")
-async def health_check():
-    return {"status": "ok", "db": "connected" if mongodb.client else "disconnected"}
+async def readiness_check():
+    if not mongodb.client:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "db": "disconnected"})
+    pool = mongodb.pool_stats.snapshot()
+    try:
+        started = time.perf_counter()
+        await mongodb.ping(timeout=settings_config.HEALTH_PING_TIMEOUT_SECONDS)
+        ping_ms = round((time.perf_counter() - started) * 1000, 1)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "db": f"unreachable: {e}", "pool": pool})
+    # Reported, not gating: checkout fails fast on its own while the breaker is open
+    return {"status": "ok", "db": "connected", "ping_ms": ping_ms, "pool": pool, "payments": payment_gateway.breaker.snapshot()}
@@ -11,7 +11,8 @@ class OrderItem(BaseModel):
     product_id: str
     name: str
     price: float
-    quantity: int
+    # Like QuoteItem: a zero or negative line would add stock and lower the total
+    quantity: int = Field(ge=1)
 
 class OrderBase(BaseModel):
     items: List[OrderItem]
@@ -25,6 +26,7 @@ class OrderBase(BaseModel):
     stripe_payment_intent_id: Optional[str] = None
     tracking_number: Optional[str] = None
     courier_name: Optional[str] = None
+    vat_rate: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class OrderCreate(BaseModel):
@@ -45,3 +47,41 @@ class Order(OrderBase):
         arbitrary_types_allowed=True,
         json_encoders={ObjectId: str},
     )
+
+class OrderSummary(BaseModel):
+    """Slim listing view: no items, addresses or payment ids."""
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    user_id: str
+    status: str = "pending"
+    total_amount: float
+    item_count: int = 0
+    customer_name: Optional[str] = None
+    customer_email: Optional[str] = None
+    tracking_number: Optional[str] = None
+    courier_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    model_config = ConfigDict(populate_by_name=True)
+
+class QuoteItem(BaseModel):
+    product_id: str
+    quantity: int = Field(ge=1)
+
+class QuoteRequest(BaseModel):
+    items: List[QuoteItem]
+
+class QuoteLine(BaseModel):
+    product_id: str
+    name: Optional[str] = None
+    quantity: int
+    unit_price: float
+    line_total: float
+
+class Quote(BaseModel):
+    """Gross (VAT included) cart prices, as checkout will charge them."""
+    items: List[QuoteLine]
+    subtotal: float
+    shipping: float
+    total: float
+    vat_rate: float
+    vat_amount: float
@@ -42,3 +42,14 @@ class Product(ProductBase):
         arbitrary_types_allowed=True,
         json_encoders={ObjectId: str},
     )
+
+class ProductSummary(BaseModel):
+    """Slim listing view (grid cards): no description, pairing or tasting notes."""
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    name: str
+    type: str
+    price: float
+    image: Optional[str] = None
+    stock: int = 0
+
+    model_config = ConfigDict(populate_by_name=True)
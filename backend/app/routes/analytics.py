@@ -1,119 +1,110 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import Any, Dict
-from app.db.mongodb import mongodb
+import asyncio
+from app.db.mongodb import mongodb, reads_from
 from app.core.security import get_current_user
 from app.models.user import User
+from app.models.order import Order
+from app.core.config import settings
+from app.core.microcache import MicroCache
+from app.core.serialization import shape, projection
+from app.core.rollups import get_daily_sales, get_total_revenue, day_key
 from datetime import datetime, timedelta
 
 router = APIRouter()
 
-@router.get("/dashboard", response_model=Dict[str, Any])
-async def get_dashboard_data(current_user: User = Depends(get_current_user)) -> Any:
-    
-    if current_user.get("role") == "admin":
+def order_view(order: Dict[str, Any]) -> Dict[str, Any]:
+    """An order document as the Order model exposes it (internal fields dropped, ids as strings)."""
+    view = shape(order, Order)
+    for key in ("_id", "user_id"):
+        if view[key] is not None:
+            view[key] = str(view[key])
+    return view
 
-        import asyncio
+dashboard_cache = MicroCache(
+    ttl=settings.DASHBOARD_CACHE_TTL_SECONDS,
+    stale_ttl=settings.DASHBOARD_CACHE_STALE_SECONDS,
+)
 
-        # Queries Definitions
-        async def get_total_users():
-            return await mongodb.db.users.count_documents({})
-        
-        async def get_total_products():
-            return await mongodb.db.products.count_documents({})
-
-        async def get_total_orders():
-            return await mongodb.db.orders.count_documents({})
-
-        async def get_total_revenue():
-            pipeline = [
-                {"$match": {"status": {"$in": ["paid", "shipped"]}}},
-                {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
-            ]
-            result = await mongodb.db.orders.aggregate(pipeline).to_list(1)
-            return result[0]["total"] if result else 0.0
-
-        async def get_recent_orders():
-            return await mongodb.db.orders.find().sort("created_at", -1).limit(5).to_list(5)
-
-        async def get_low_stock():
-            return await mongodb.db.products.find({"stock": {"$lte": 5}}).limit(5).to_list(5)
-
-        async def get_sales_chart():
-            seven_days_ago = datetime.utcnow() - timedelta(days=7)
-            pipeline_chart = [
-                {"$match": {
-                    "status": {"$in": ["paid", "shipped"]},
-                    "created_at": {"$gte": seven_days_ago}
-                }},
-                {"$group": {
-                    "_id": {
-                        "year": {"$year": "$created_at"},
-                        "month": {"$month": "$created_at"},
-                        "day": {"$dayOfMonth": "$created_at"}
-                    },
-                    "total": {"$sum": "$total_amount"}
-                }},
-                {"$sort": {"_id.year": 1, "_id.month": 1, "_id.day": 1}}
-            ]
-            return await mongodb.db.orders.aggregate(pipeline_chart).to_list(7)
-
-        # Execute all in parallel
-        (
-            total_users, 
-            total_products, 
-            total_orders, 
-            total_revenue, 
-            recent_orders, 
-            low_stock_products, 
-            chart_data
-        ) = await asyncio.gather(
-            get_total_users(),
-            get_total_products(),
-            get_total_orders(),
-            get_total_revenue(),
-            get_recent_orders(),
-            get_low_stock(),
-            get_sales_chart()
-        )
-
-        # Convert ObjectId to string for recent orders
-        for order in recent_orders:
-            order["_id"] = str(order["_id"])
-            if "user_id" in order: order["user_id"] = str(order["user_id"])
-
-        # Convert ObjectId for low stock
-        for p in low_stock_products:
-            p["_id"] = str(p["_id"])
-        
-        # Create a map for quick access
-        data_map = {
-            f"{entry['_id']['day']:02d}/{entry['_id']['month']:02d}": entry["total"] 
-            for entry in chart_data
-        }
+async def build_admin_dashboard(db, days: int) -> Dict[str, Any]:
+    # Queries Definitions
+    async def get_total_users():
+        return await db.users.count_documents({})
 
-        # Fill last 7 days
-        sales_chart = []
-        for i in range(6, -1, -1):
-            date_obj = datetime.utcnow() - timedelta(days=i)
-            date_key = f"{date_obj.day:02d}/{date_obj.month:02d}"
-            sales_chart.append({
-                "date": date_key,
-                "total": data_map.get(date_key, 0.0)
-            })
+    async def get_total_products():
+        return await db.products.count_documents({})
 
-        return {
-            "role": "admin",
-            "total_users": total_users,
-            "total_products": total_products,
-            "total_orders": total_orders,
-            "total_revenue": total_revenue,
-            "recent_orders": recent_orders,
-            "low_stock_products": low_stock_products,
-            "sales_chart": sales_chart
-        }
+    async def get_total_orders():
+        return await db.orders.count_documents({})
+
+    async def get_recent_orders():
+        return await db.orders.find({}, projection(Order)).sort("created_at", -1).limit(5).to_list(5)
+
+    async def get_low_stock():
+        # stock_holds holds ObjectIds of pending orders, not needed (nor serialisable) here
+        return await db.products.find({"stock": {"$lte": 5}}, {"stock_holds": 0}).limit(5).to_list(5)
+
+    # Execute all in parallel
+    (
+        total_users, 
+        total_products, 
+        total_orders, 
+        total_revenue, 
+        recent_orders, 
+        low_stock_products, 
+        chart_data
+    ) = await asyncio.gather(
+        get_total_users(),
+        get_total_products(),
+        get_total_orders(),
+        get_total_revenue(db),
+        get_recent_orders(),
+        get_low_stock(),
+        get_daily_sales(days, db)
+    )
+
+    recent_orders = [order_view(order) for order in recent_orders]
+
+    # Convert ObjectId for low stock
+    for p in low_stock_products:
+        p["_id"] = str(p["_id"])
+
+    # Create a map for quick access
+    data_map = {entry["_id"]: entry.get("revenue", 0.0) for entry in chart_data}
+
+    # Fill the requested range, days without sales included
+    sales_chart = []
+    for i in range(days - 1, -1, -1):
+        date_obj = datetime.utcnow() - timedelta(days=i)
+        sales_chart.append({
+            "date": f"{date_obj.day:02d}/{date_obj.month:02d}",
+            "total": data_map.get(day_key(date_obj), 0.0)
+        })
+
+    return {
+        "role": "admin",
+        "total_users": total_users,
+        "total_products": total_products,
+        "total_orders": total_orders,
+        "total_revenue": total_revenue,
+        "recent_orders": recent_orders,
+        "low_stock_products": low_stock_products,
+        "sales_chart": sales_chart
+    }
+
+@router.get("/dashboard", response_model=Dict[str, Any])
+async def get_dashboard_data(
+    days: int = Query(7, ge=1, le=365, description="Sales chart range, e.g. 7, 30, 90 or 365"),
+    current_user: User = Depends(get_current_user),
+    analytics_db = Depends(reads_from("analytics")),
+) -> Any:
+    
+    if current_user.get("role") == "admin":
+        # Served from a short-lived cache; concurrent loads share one computation
+        return await dashboard_cache.get(("admin", days), lambda: build_admin_dashboard(analytics_db, days))
         
     else:
-        # User Analytics
+        # User Analytics (primary: a customer expects to see the order they just placed)
         user_id = str(current_user["_id"])
         total_orders = await mongodb.db.orders.count_documents({"user_id": user_id})
         
@@ -124,10 +115,9 @@ async def get_dashboard_data(current_user: User = Depends(get_current_user)) ->
         spent_result = await mongodb.db.orders.aggregate(pipeline).to_list(1)
         total_spent = spent_result[0]["total"] if spent_result else 0.0
         
-        last_order = await mongodb.db.orders.find_one({"user_id": user_id}, sort=[("created_at", -1)])
+        last_order = await mongodb.db.orders.find_one({"user_id": user_id}, projection(Order), sort=[("created_at", -1)])
         if last_order:
-             last_order["_id"] = str(last_order["_id"])
-             last_order["user_id"] = str(last_order["user_id"])
+             last_order = order_view(last_order)
 
         return {
             "role": "user",
@@ -135,3 +125,9 @@ async def get_dashboard_data(current_user: User = Depends(get_current_user)) ->
             "total_spent": total_spent,
             "last_order": last_order
         }
+
+@router.get("/cache-stats", response_model=Dict[str, Any])
+async def get_cache_stats(current_user: User = Depends(get_current_user)) -> Any:
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {"dashboard": dashboard_cache.snapshot()}
@@ -1,11 +1,12 @@
 
-from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks
-from app.core.email_utils import send_email_background
+from fastapi import APIRouter, HTTPException, status, Depends
+from app.core.email_utils import enqueue_email
 from fastapi.security import OAuth2PasswordRequestForm
 from app.models.user import UserCreate, User, UserInDB, UserUpdate
 from pydantic import EmailStr
-from app.core.security import get_password_hash, verify_password, create_access_token, get_current_active_user
+from app.core.security import get_password_hash_async, verify_password_async, create_access_token, get_current_active_user
 from app.db.mongodb import mongodb
+from app.core.user_cache import user_cache
 from bson import ObjectId
 from typing import Any
 
@@ -26,13 +27,14 @@ async def update_user_me(user_in: UserUpdate, current_user: User = Depends(get_c
             {"_id": current_user["_id"]},
             {"$set": update_data}
         )
+        user_cache.invalidate(current_user["_id"])
         # Fetch updated user
         current_user = await mongodb.db.users.find_one({"_id": current_user["_id"]})
         
     return current_user
 
 @router.post("/register", response_model=User, status_code=status.HTTP_201_CREATED)
-async def register(user_in: UserCreate, background_tasks: BackgroundTasks) -> Any:
+async def register(user_in: UserCreate) -> Any:
     # Check if user exists
     existing_user = await mongodb.db.users.find_one({"email": user_in.email})
     if existing_user:
@@ -43,7 +45,7 @@ async def register(user_in: UserCreate, background_tasks: BackgroundTasks) -> An
     
     # Create new user
     user_data = user_in.dict()
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await get_password_hash_async(user_in.password)
     del user_data["password"]
     user_data["hashed_password"] = hashed_password
     
@@ -58,8 +60,7 @@ async def register(user_in: UserCreate, background_tasks: BackgroundTasks) -> An
     <br>
     <p>A presto,<br>Il Team di Il Colle Tinto</p>
     """
-    background_tasks.add_task(
-        send_email_background,
+    await enqueue_email(
         user_in.email,
         "Benvenuto nel mondo de Il Colle Tinto",
         email_html
@@ -79,7 +80,7 @@ class Token(BaseModel):
 
 async def authenticate_user(email: str, password: str):
     user = await mongodb.db.users.find_one({"email": email})
-    if not user or not verify_password(password, user["hashed_password"]):
+    if not user or not await verify_password_async(password, user["hashed_password"]):
         return None
     return user
 
@@ -125,7 +126,7 @@ class ForgotPasswordRequest(BaseModel):
     email: EmailStr
 
 @router.post("/forgot-password")
-async def forgot_password(request: ForgotPasswordRequest, background_tasks: BackgroundTasks):
+async def forgot_password(request: ForgotPasswordRequest):
     user = await mongodb.db.users.find_one({"email": request.email})
     if not user:
         # Don't reveal if user exists
@@ -139,6 +140,7 @@ async def forgot_password(request: ForgotPasswordRequest, background_tasks: Back
         {"_id": user["_id"]},
         {"$set": {"reset_token": token, "reset_token_expires": expires}}
     )
+    user_cache.invalidate(user["_id"])
     
     # Send Email
     reset_link = f"http://localhost:3000/reset-password?token={token}"
@@ -150,8 +152,7 @@ async def forgot_password(request: ForgotPasswordRequest, background_tasks: Back
     <p>Se non sei stato tu, ignora questa email.</p>
     """
     
-    background_tasks.add_task(
-        send_email_background,
+    await enqueue_email(
         request.email,
         "Recupero Password - Il Colle Tinto",
         email_html
@@ -172,15 +173,16 @@ async def reset_password(request: ResetPasswordRequest):
     if user.get("reset_token_expires") < datetime.utcnow():
         raise HTTPException(status_code=400, detail="Token expired")
     
-    hashed_password = get_password_hash(request.new_password)
+    hashed_password = await get_password_hash_async(request.new_password)
     
     await mongodb.db.users.update_one(
         {"_id": user["_id"]},
-        {"$set": {
-            "hashed_password": hashed_password,
-            "reset_token": None,
-            "reset_token_expires": None
-        }}
+        {
+            "$set": {"hashed_password": hashed_password},
+            # Unset rather than null so the user leaves the sparse reset_token index
+            "$unset": {"reset_token": "", "reset_token_expires": ""}
+        }
     )
+    user_cache.invalidate(user["_id"])
     
     return {"msg": "Password updated successfully"}
@@ -1,168 +1,171 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from app.core.email_utils import send_email_background
-from typing import List, Any
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query, Header
+from fastapi.responses import StreamingResponse
+from typing import List, Any, Optional, Union
 from app.db.mongodb import mongodb
-from app.models.order import Order, OrderCreate
+from app.models.order import Order, OrderCreate, OrderSummary, Quote, QuoteRequest
 from app.core.security import get_current_user
 from app.models.user import User
-from app.core.config import settings
-import stripe
+from app.core.settings_cache import settings_cache
+from app.core.serialization import FastJSONResponse, serialize_documents, projection
+from app.core.pagination import newest_first_page, next_cursor, NEXT_CURSOR_HEADER, MAX_PAGE_SIZE
+from app.core.order_export import stream_csv, stream_ndjson, EXPORT_BATCH_SIZE
+from app.core.rollups import record_status_change, record_status_changes
+from app.core.checkout import run_checkout, checkout_deadline
+from app.core.idempotency import idempotency_store
+from app.core.events import event_bus, OrderStatusChanged
+from app.core.price_book import price_book, UnknownProduct, to_euros
+from app.core.reservations import commit_reservation, release_reservation, commit_reservations, release_reservations
+from bson import ObjectId
+from pymongo import UpdateOne
 from datetime import datetime
 
 router = APIRouter()
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+@router.post("/quote", response_model=Quote)
+async def quote_cart(quote_in: QuoteRequest) -> Any:
+    """Prices a cart from the in-memory price book, exactly as checkout will."""
+    quantities = {}
+    for item in quote_in.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    await price_book.ensure_fresh()
+    try:
+        quote = price_book.quote(quantities)
+    except UnknownProduct as e:
+        raise HTTPException(status_code=400, detail=f"Prodotto non trovato: {e.product_id}")
+    return {
+        "items": [
+            {
+                "product_id": line["product_id"],
+                "name": line["name"],
+                "quantity": line["quantity"],
+                "unit_price": to_euros(line["unit_price_cents"]),
+                "line_total": to_euros(line["line_total_cents"]),
+            }
+            for line in quote["items"]
+        ],
+        "subtotal": to_euros(quote["subtotal_cents"]),
+        "shipping": to_euros(quote["shipping_cents"]),
+        "total": to_euros(quote["total_cents"]),
+        "vat_rate": quote["vat_rate"],
+        "vat_amount": to_euros(quote["vat_cents"]),
+    }
 
 @router.post("/checkout", status_code=status.HTTP_201_CREATED)
-async def create_checkout_session(order_in: OrderCreate, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)) -> Any:
-    # --- Check Stock & Calculate Shipping ---
-    site_settings = await mongodb.db.settings.find_one({})
-    shipping_cost = site_settings.get("shipping_cost", 10.0) if site_settings else 10.0
-    free_threshold = site_settings.get("free_shipping_threshold", 100.0) if site_settings else 100.0
-    vat_rate = site_settings.get("vat_rate", 22.0) if site_settings else 22.0
-    
-    # Calculate items total
-    items_total = 0.0
-    for item in order_in.items:
-        product = await mongodb.db.products.find_one({"_id": ObjectId(item.product_id)})
-        if not product:
-            raise HTTPException(status_code=400, detail=f"Prodotto non trovato: {item.name}")
-        
-        # Check Stock
-        current_stock = product.get("stock", 0)
-        if current_stock < item.quantity:
-             raise HTTPException(status_code=400, detail=f"Quantità non disponibile per {item.name}. Disponibili: {current_stock}")
-        
-        # Calculate Gross Price (Net * (1 + VAT/100))
-        net_price = product.get("price", 0.0)
-        gross_price = net_price * (1 + vat_rate / 100)
-        items_total += gross_price * item.quantity
-
-    # Determine shipping
-    final_shipping = 0.0
-    # For free shipping threshold, usually we check the Subtotal (items_total)
-    if items_total < free_threshold:
-        final_shipping = shipping_cost
-    
-    # Verify Total (Frontend vs Backend)
-    calculated_total = items_total + final_shipping
-    # Allow small tolerance
-    if abs(calculated_total - order_in.total_amount) > 0.1:
-        raise HTTPException(status_code=400, detail=f"Totale ordine non valido. Backend: {calculated_total}, Frontend: {order_in.total_amount}")
-    
-    # --- Decrement Stock ---
-    for item in order_in.items:
-         await mongodb.db.products.update_one(
-            {"_id": ObjectId(item.product_id)},
-            {"$inc": {"stock": -item.quantity}}
-        )
+async def create_checkout_session(
+    order_in: OrderCreate,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+) -> Any:
+    # validate -> price -> payment -> reserve + persist (one transaction); emails follow from OrderCreated
+    async def checkout():
+        try:
+            return await run_checkout(order_in, current_user)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    # 1. Calculate total from backend (security best practice) - skipping for speed, trusting frontend for now but validating consistency later.
-    amount = int(order_in.total_amount * 100) # Cents for Stripe
+    if not idempotency_key:
+        return await checkout()
+    # Retries with the same key get the first result back: one order, one hold, one email
+    key = f"checkout:{current_user['_id']}:{idempotency_key}"
+    fingerprint = idempotency_store.fingerprint(order_in.model_dump_json().encode())
+    # Duplicates wait as long as this checkout can take (slow Stripe included) before a 409
+    result, replayed = await idempotency_store.run(key, fingerprint, checkout, wait_seconds=checkout_deadline())
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
-    try:
-        # 2. Create Stripe PaymentIntent
-        # For 'predisposizione', we try to create an intent if key is present, else mock.
-        client_secret = "mock_secret"
-        payment_intent_id = "mock_pi_" + str(datetime.now().timestamp())
-
-        # Try to contact Stripe if a key that looks like a test key is present
-        if "sk_test" in settings.STRIPE_SECRET_KEY and "placeholder" not in settings.STRIPE_SECRET_KEY:
-            try:
-                intent = stripe.PaymentIntent.create(
-                    amount=amount,
-                    currency="eur",
-                    automatic_payment_methods={"enabled": True},
-                )
-                client_secret = intent.client_secret
-                payment_intent_id = intent.id
-            except stripe.error.StripeError as e:
-                # If Stripe fails (e.g. invalid key), fallback to mock for dev
-                print(f"Stripe Error (falling back to mock): {e}")
-                pass
-        
-        # 3. Save Order to DB
-        order_data = order_in.dict()
-        order_data["user_id"] = str(current_user["_id"])
-        order_data["user_id"] = str(current_user["_id"])
-        order_data["customer_name"] = current_user.get("full_name")
-        order_data["customer_email"] = current_user.get("email")
-        # If tax code not in payload, try from profile, though frontend should send it.
-        if not order_data.get("customer_tax_code"):
-             order_data["customer_tax_code"] = current_user.get("tax_code")
-        
-        # Ensure tax code is present
-        if not order_data.get("customer_tax_code"):
-            raise HTTPException(status_code=400, detail="Codice Fiscale obbligatorio.")
-
-        order_data["status"] = "pending"
-        order_data["stripe_payment_intent_id"] = payment_intent_id
-        order_data["created_at"] = datetime.utcnow()
-
-        result = await mongodb.db.orders.insert_one(order_data)
-        
-        # --- Auto-update User Profile with latest checkout data ---
-        user_update_data = {
-            "shipping_address": order_in.shipping_address.dict(),
-            "billing_address": order_in.billing_address.dict(),
-            "tax_code": order_data["customer_tax_code"]
-        }
-        # Only update if fields are present in the order (which they are, validated by pydantic/frontend)
-        await mongodb.db.users.update_one(
-            {"_id": current_user["_id"]},
-            {"$set": user_update_data}
-        )
-        # ----------------------------------------------------------
-        
-        # Send Order Confirmation Email via Background Task
-        email_html = f"""
-        <h1>Grazie per il tuo ordine, {order_data["customer_name"]}!</h1>
-        <p>Il tuo ordine #{str(result.inserted_id)} è stato ricevuto ed è {order_data["status"]}.</p>
-        <p><strong>Totale:</strong> €{order_in.total_amount:.2f}</p>
-        <h3>Riepilogo:</h3>
-        <ul>
-        """
-        for item in order_in.items:
-             email_html += f"<li>{item.quantity}x {item.name} - €{item.price:.2f}</li>"
-        
-        email_html += f"""
-        </ul>
-        <br>
-        <p>A presto,<br>Il Team di ColleShop</p>
-        """
-
-        if order_data.get("customer_email"):
-             background_tasks.add_task(
-                send_email_background, 
-                order_data["customer_email"], 
-                f"Conferma Ordine #{str(result.inserted_id)}", 
-                email_html
-            )
-
-        return {
-            "orderId": str(result.inserted_id),
-            "clientSecret": client_secret
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
-
-
-@router.get("/mine", response_model=List[Order])
-async def get_my_orders(current_user: User = Depends(get_current_user)) -> Any:
-    orders = await mongodb.db.orders.find({"user_id": str(current_user["_id"])}).to_list(100)
-    return orders
-
-@router.get("/", response_model=List[Order])
-async def get_all_orders(current_user: User = Depends(get_current_user)) -> Any:
+def order_filters(order_status: Optional[str], date_from: Optional[datetime], date_to: Optional[datetime]) -> dict:
+    query = {}
+    if order_status:
+        query["status"] = order_status
+    if date_from or date_to:
+        query["created_at"] = {}
+        if date_from:
+            query["created_at"]["$gte"] = date_from
+        if date_to:
+            query["created_at"]["$lte"] = date_to
+    return query
+
+# List views: response model and the Mongo projection that feeds it
+ORDER_VIEWS = {
+    "summary": (OrderSummary, projection(OrderSummary, {"item_count": {"$size": {"$ifNull": ["$items", []]}}})),
+    "full": (Order, projection(Order)),
+}
+
+async def fetch_orders_page(query: dict, cursor: Optional[str], limit: int, view: str) -> Response:
+    """Newest orders first, keyset-paginated; the next cursor goes in the response headers."""
+    model, fields = ORDER_VIEWS[view]
+    query, sort = newest_first_page(query, cursor)
+    orders = await mongodb.db.orders.find(query, fields).sort(sort).limit(limit).to_list(limit)
+    following = next_cursor(orders, limit, "created_at")
+    headers = {NEXT_CURSOR_HEADER: following} if following else None
+    # Stored orders were validated at checkout, so they skip the response_model pass
+    return FastJSONResponse(serialize_documents(orders, model), headers=headers)
+
+@router.get("/mine", response_model=Union[List[Order], List[OrderSummary]])
+async def get_my_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    order_status: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    view: str = Query("full", pattern="^(summary|full)$", description="summary: no items, addresses or payment ids"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    query = order_filters(order_status, date_from, date_to)
+    query["user_id"] = str(current_user["_id"])
+    return await fetch_orders_page(query, cursor, limit, view)
+
+@router.get("/", response_model=Union[List[Order], List[OrderSummary]])
+async def get_all_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    order_status: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    customer: Optional[str] = Query(None, description="Customer user id or email"),
+    view: str = Query("full", pattern="^(summary|full)$", description="summary: no items, addresses or payment ids"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
      # Basic admin check (could be improved)
     if current_user.get("role") != "admin":
          raise HTTPException(status_code=403, detail="Not authorized")
     
-    orders = await mongodb.db.orders.find().to_list(100)
-    return orders
+    query = order_filters(order_status, date_from, date_to)
+    if customer:
+        if "@" in customer:
+            query["customer_email"] = customer
+        else:
+            query["user_id"] = customer
+    return await fetch_orders_page(query, cursor, limit, view)
 
-from bson import ObjectId
+@router.get("/export")
+async def export_orders(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    order_status: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Streams orders as CSV or NDJSON for accounting, oldest first."""
+    if current_user.get("role") != "admin":
+         raise HTTPException(status_code=403, detail="Not authorized")
+
+    site_settings = await settings_cache.get_document()
+    default_vat_rate = site_settings.get("vat_rate", 22.0) if site_settings else 22.0
+
+    query = order_filters(order_status, date_from, date_to)
+    cursor = mongodb.db.orders.find(query).sort([("created_at", 1), ("_id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+
+    filename = f"ordini-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    if format == "ndjson":
+        body, media_type = stream_ndjson(cursor, default_vat_rate), "application/x-ndjson"
+    else:
+        body, media_type = stream_csv(cursor, default_vat_rate), "text/csv; charset=utf-8"
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @router.get("/{id}", response_model=Order)
 async def get_order_by_id(id: str, current_user: User = Depends(get_current_user)) -> Any:
@@ -177,14 +180,126 @@ async def get_order_by_id(id: str, current_user: User = Depends(get_current_user
     return order
 
 from pydantic import BaseModel
-from typing import Optional
 class OrderStatusUpdate(BaseModel):
     status: str
     tracking_number: Optional[str] = None
     courier_name: Optional[str] = None
 
+def status_changed(order: dict, status_update: OrderStatusUpdate, source: str = "admin") -> OrderStatusChanged:
+    """The event for a status change, built from the order as it was before the change."""
+    return OrderStatusChanged(
+        order_id=str(order["_id"]),
+        customer_name=order.get("customer_name"),
+        customer_email=order.get("customer_email"),
+        old_status=order.get("status"),
+        new_status=status_update.status,
+        tracking_number=status_update.tracking_number or order.get("tracking_number"),
+        courier_name=status_update.courier_name or order.get("courier_name"),
+        source=source,
+    )
+
+def status_update_ops(order: dict, status_update: OrderStatusUpdate) -> dict:
+    update_data = {"status": status_update.status}
+    if status_update.tracking_number:
+        update_data["tracking_number"] = status_update.tracking_number
+    if status_update.courier_name:
+        update_data["courier_name"] = status_update.courier_name
+
+    update_ops = {"$set": update_data}
+    if status_update.status != "pending" and order.get("reservation_expires_at"):
+        update_ops["$unset"] = {"reservation_expires_at": ""}
+    return update_ops
+
+class BulkStatusItem(OrderStatusUpdate):
+    id: str
+
+class BulkStatusUpdate(BaseModel):
+    updates: List[BulkStatusItem]
+
+class BulkStatusResult(BaseModel):
+    id: str
+    ok: bool
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+@router.put("/status:bulk", response_model=List[BulkStatusResult])
+async def bulk_update_order_status(bulk_in: BulkStatusUpdate, current_user: User = Depends(get_current_user)) -> Any:
+    """
+    Applies many status changes at once: one read, one bulk_write for the orders,
+    one $inc per product for cancellations and one insert for the OrderStatusChanged events.
+    Each order gets its own result; a failure on one doesn't stop the others.
+    """
+    # Admin only
+    if current_user.get("role") != "admin":
+         raise HTTPException(status_code=403, detail="Not authorized")
+
+    results = {}
+    requested = {}
+    seen = set()
+    duplicates = {item.id for item in bulk_in.updates if item.id in seen or seen.add(item.id)}
+    for item in bulk_in.updates:
+        if not ObjectId.is_valid(item.id):
+            results[item.id] = BulkStatusResult(id=item.id, ok=False, error="Invalid ID format")
+        elif item.id in duplicates:
+            results[item.id] = BulkStatusResult(id=item.id, ok=False, error="Duplicate order id")
+        else:
+            requested[item.id] = item
+
+    orders = await mongodb.db.orders.find(
+        {"_id": {"$in": [ObjectId(order_id) for order_id in requested]}}
+    ).to_list(len(requested))
+    orders_by_id = {str(order["_id"]): order for order in orders}
+
+    # Every update is conditional on the status we read; the batch id tells which ones applied
+    batch_id = ObjectId()
+    operations = []
+    for order_id, item in requested.items():
+        order = orders_by_id.get(order_id)
+        if not order:
+            results[order_id] = BulkStatusResult(id=order_id, ok=False, error="Order not found")
+            continue
+        update_ops = status_update_ops(order, item)
+        update_ops["$set"]["status_batch_id"] = str(batch_id)
+        operations.append(UpdateOne({"_id": order["_id"], "status": order.get("status")}, update_ops))
+
+    applied_ids = set()
+    if operations:
+        result = await mongodb.db.orders.bulk_write(operations, ordered=False)
+        if result.matched_count == len(operations):
+            applied_ids = {order_id for order_id in requested if order_id in orders_by_id}
+        else:
+            applied = await mongodb.db.orders.find({"status_batch_id": str(batch_id)}, {"_id": 1}).to_list(len(operations))
+            applied_ids = {str(order["_id"]) for order in applied}
+        # The marker only matters for the query above
+        await mongodb.db.orders.update_many({"status_batch_id": str(batch_id)}, {"$unset": {"status_batch_id": ""}})
+
+    changed = []
+    for order_id, item in requested.items():
+        if order_id in results:
+            continue
+        if order_id in applied_ids:
+            changed.append((orders_by_id[order_id], item))
+            results[order_id] = BulkStatusResult(id=order_id, ok=True, status=item.status)
+        else:
+            results[order_id] = BulkStatusResult(id=order_id, ok=False, error="Order status changed meanwhile, please reload")
+
+    if changed:
+        await record_status_changes([(order, item.status) for order, item in changed])
+        await release_reservations([
+            order for order, item in changed
+            if item.status == "cancelled" and order.get("status") != "cancelled"
+        ])
+        await commit_reservations([
+            order for order, item in changed
+            if item.status not in ("pending", "cancelled")
+        ])
+
+        await event_bus.publish(*[status_changed(order, item, source="bulk") for order, item in changed])
+
+    return [results[item.id] for item in bulk_in.updates]
+
 @router.put("/{id}/status", response_model=Order)
-async def update_order_status(id: str, status_update: OrderStatusUpdate, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)) -> Any:
+async def update_order_status(id: str, status_update: OrderStatusUpdate, current_user: User = Depends(get_current_user)) -> Any:
     # Admin only
     if current_user.get("role") != "admin":
          raise HTTPException(status_code=403, detail="Not authorized")
@@ -193,58 +308,26 @@ async def update_order_status(id: str, status_update: OrderStatusUpdate, backgro
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    # If cancelling, restore stock
-    if status_update.status == "cancelled" and order.get("status") != "cancelled":
-        for item in order.get("items", []):
-             await mongodb.db.products.update_one(
-                {"_id": ObjectId(item["product_id"])},
-                {"$inc": {"stock": item["quantity"]}}
-            )
-            
-    update_data = {"status": status_update.status}
-    if status_update.tracking_number:
-        update_data["tracking_number"] = status_update.tracking_number
-    if status_update.courier_name:
-        update_data["courier_name"] = status_update.courier_name
+    update_ops = status_update_ops(order, status_update)
 
+    # Only apply the change if nobody (e.g. the reservation sweeper) moved the order meanwhile
     result = await mongodb.db.orders.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": update_data}
+        {"_id": ObjectId(id), "status": order.get("status")},
+        update_ops
     )
     
     if result.matched_count == 0:
-         raise HTTPException(status_code=404, detail="Order not found")
+         raise HTTPException(status_code=409, detail="Order status changed meanwhile, please reload")
 
-    updated_order = await mongodb.db.orders.find_one({"_id": ObjectId(id)})
+    await record_status_change(order, status_update.status)
 
-    # Send status update email
-    email_html = f"""
-    <h1>Aggiornamento Ordine #{str(updated_order["_id"])}</h1>
-    <p>Gentile {updated_order.get("customer_name")},</p>
-    <p>Lo stato del tuo ordine è stato aggiornato a: <strong>{status_update.status}</strong></p>
-    """
+    # If cancelling, restore stock; if leaving pending otherwise, the reservation becomes final
+    if status_update.status == "cancelled" and order.get("status") != "cancelled":
+        await release_reservation(order)
+    elif status_update.status != "pending" and order.get("reservation_expires_at"):
+        await commit_reservation(order)
 
-    if status_update.status == "shipped" and updated_order.get("tracking_number"):
-        email_html += f"""
-        <div style="background-color: #f3f4f6; padding: 15px; border-radius: 5px; margin: 15px 0;">
-            <p style="margin: 0; font-weight: bold;">Dettagli Spedizione:</p>
-            <p style="margin: 5px 0 0 0;">Corriere: {updated_order.get('courier_name', 'N/D')}</p>
-            <p style="margin: 5px 0 0 0;">Tracking Number: {updated_order.get('tracking_number')}</p>
-        </div>
-        """
-
-    email_html += """
-    <br>
-    <p>Puoi seguire i dettagli nella tua area riservata.</p>
-    <p>A presto,<br>Il Team di ColleShop</p>
-    """
-    
-    if updated_order.get("customer_email"):
-         background_tasks.add_task(
-            send_email_background, 
-            updated_order["customer_email"], 
-            f"Aggiornamento Ordine #{str(updated_order['_id'])}", 
-            email_html
-        )
+    await event_bus.publish(status_changed(order, status_update))
 
+    updated_order = await mongodb.db.orders.find_one({"_id": ObjectId(id)})
     return updated_order
@@ -1,29 +1,150 @@
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Any
-from app.models.product import Product, ProductCreate, ProductUpdate
-from app.db.mongodb import mongodb
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response, Query
+from typing import List, Any, Optional, Union
+from app.models.product import Product, ProductCreate, ProductUpdate, ProductSummary
+from app.db.mongodb import mongodb, reads_from
+from app.core.catalog_cache import catalog_cache, etag_matches
+from app.core.serialization import FastJSONResponse, projection, shape
+from app.core.search_index import search_index
+from app.core.price_book import price_book
+from app.core.pagination import id_page, next_cursor, NEXT_CURSOR_HEADER, MAX_PAGE_SIZE
 from bson import ObjectId
 
 router = APIRouter()
 
-@router.get("/", response_model=List[Product])
-async def get_products(skip: int = 0, limit: int = 100) -> Any:
-    products = await mongodb.db.products.find().skip(skip).limit(limit).to_list(100)
-    return products
+# List views: response model and the Mongo projection that feeds it
+PRODUCT_VIEWS = {
+    "summary": (ProductSummary, projection(ProductSummary)),
+    "full": (Product, projection(Product)),
+}
+
+@router.get("/", response_model=Union[List[Product], List[ProductSummary]])
+async def get_products(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    view: str = Query("full", pattern="^(summary|full)$", description="summary: grid fields only"),
+    catalog_db = Depends(reads_from("catalog")),
+) -> Any:
+    query = {}
+    if type:
+        query["type"] = type
+    if min_price is not None or max_price is not None:
+        query["price"] = {}
+        if min_price is not None:
+            query["price"]["$gte"] = min_price
+        if max_price is not None:
+            query["price"]["$lte"] = max_price
+    if in_stock is not None:
+        query["stock"] = {"$gt": 0} if in_stock else {"$lte": 0}
+    query, sort = id_page(query, cursor)
+
+    async def fetch():
+        products = await catalog_db.products.find(query, PRODUCT_VIEWS[view][1]).sort(sort).limit(limit).to_list(limit)
+        return products, next_cursor(products, limit)
+
+    # Served as cached, pre-serialised JSON; clients revalidate with If-None-Match
+    cache_key = (cursor, limit, type, min_price, max_price, in_stock, view)
+    body, etag, following = await catalog_cache.get(cache_key, fetch, PRODUCT_VIEWS[view][0])
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if following:
+        headers[NEXT_CURSOR_HEADER] = following
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Price facet buckets (net prices, EUR)
+PRICE_BUCKETS = [0, 15, 25, 40, 60]
+
+@router.get("/search")
+async def search_products(
+    q: str = Query("", max_length=100),
+    type: Optional[str] = None,
+    year: Optional[str] = None,
+    grape: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    fuzzy: bool = Query(False, description="Prefix and typo-tolerant matching with the in-process index"),
+    limit: int = Query(24, ge=1, le=MAX_PAGE_SIZE),
+    catalog_db = Depends(reads_from("catalog")),
+) -> Any:
+    """
+    Catalog search with facet counts for type, year, grape and price buckets.
+    Results and facets come from a single $facet aggregation.
+    """
+    match = {}
+    ranked_ids = None
+    if q.strip():
+        if fuzzy:
+            await search_index.ensure_built()
+            ranked_ids = search_index.search(q)
+            match["_id"] = {"$in": [ObjectId(pid) for pid in ranked_ids]}
+        else:
+            match["$text"] = {"$search": q}
+    for field, value in (("type", type), ("year", year), ("grape", grape)):
+        if value:
+            match[field] = value
+    if min_price is not None or max_price is not None:
+        match["price"] = {}
+        if min_price is not None:
+            match["price"]["$gte"] = min_price
+        if max_price is not None:
+            match["price"]["$lte"] = max_price
+
+    pipeline = [{"$match": match}]
+    if "$text" in match:
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+        results_sort = [{"$sort": {"score": -1, "_id": 1}}]
+    elif ranked_ids is not None:
+        # Keep the in-process index ranking
+        pipeline.append({"$addFields": {"score": {"$indexOfArray": [[ObjectId(pid) for pid in ranked_ids], "$_id"]}}})
+        results_sort = [{"$sort": {"score": 1}}]
+    else:
+        results_sort = [{"$sort": {"name": 1, "_id": 1}}]
+    pipeline.append({"$facet": {
+        "results": results_sort + [{"$limit": limit}, {"$project": PRODUCT_VIEWS["full"][1]}],
+        "total": [{"$count": "count"}],
+        "type": [{"$sortByCount": "$type"}],
+        "year": [{"$sortByCount": "$year"}],
+        "grape": [{"$sortByCount": "$grape"}],
+        "price": [{"$bucket": {"groupBy": "$price", "boundaries": PRICE_BUCKETS, "default": f"{PRICE_BUCKETS[-1]}+"}}],
+    }})
+
+    result = (await catalog_db.products.aggregate(pipeline).to_list(1))[0]
+
+    def counts(entries):
+        return [{"value": entry["_id"], "count": entry["count"]} for entry in entries]
+
+    return FastJSONResponse({
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "results": [shape(product, Product) for product in result["results"]],
+        "facets": {
+            "type": counts(result["type"]),
+            "year": counts(result["year"]),
+            "grape": counts(result["grape"]),
+            "price": counts(result["price"]),
+        },
+    })
 
 @router.post("/", response_model=Product, status_code=status.HTTP_201_CREATED)
 async def create_product(product_in: ProductCreate) -> Any:
     product_data = product_in.dict()
     result = await mongodb.db.products.insert_one(product_data)
+    catalog_cache.bump()
     created_product = await mongodb.db.products.find_one({"_id": result.inserted_id})
+    search_index.upsert(created_product)
+    price_book.upsert(created_product)
     return created_product
 
 @router.get("/{id}", response_model=Product)
-async def get_product(id: str) -> Any:
+async def get_product(id: str, catalog_db = Depends(reads_from("catalog"))) -> Any:
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    product = await mongodb.db.products.find_one({"_id": ObjectId(id)})
+    product = await catalog_db.products.find_one({"_id": ObjectId(id)})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
@@ -39,6 +160,7 @@ async def update_product(id: str, product_in: ProductUpdate) -> Any:
         update_result = await mongodb.db.products.update_one(
             {"_id": ObjectId(id)}, {"$set": product_data}
         )
+        catalog_cache.bump()
         if update_result.modified_count == 0:
              # Check if product exists
              existing = await mongodb.db.products.find_one({"_id": ObjectId(id)})
@@ -46,6 +168,9 @@ async def update_product(id: str, product_in: ProductUpdate) -> Any:
                  raise HTTPException(status_code=404, detail="Product not found")
 
     updated_product = await mongodb.db.products.find_one({"_id": ObjectId(id)})
+    if updated_product:
+        search_index.upsert(updated_product)
+        price_book.upsert(updated_product)
     return updated_product
 
 @router.delete("/{id}", response_model=Product)
@@ -58,4 +183,7 @@ async def delete_product(id: str) -> Any:
         raise HTTPException(status_code=404, detail="Product not found")
         
     await mongodb.db.products.delete_one({"_id": ObjectId(id)})
+    catalog_cache.bump()
+    search_index.remove(id)
+    price_book.remove(id)
     return product
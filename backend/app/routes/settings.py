@@ -3,21 +3,15 @@ from app.db.mongodb import mongodb
 from app.models.settings import SiteSettings, SettingsUpdate
 from app.core.security import get_current_user
 from app.models.user import User
+from app.core.settings_cache import settings_cache
 from typing import Any
 
 router = APIRouter()
 
 @router.get("/", response_model=SiteSettings)
 async def get_settings() -> Any:
-    # Try to find existing settings
-    settings = await mongodb.db.settings.find_one({})
-    
-    if not settings:
-        # Return defaults if not found (or create them?)
-        # Let's return defaults
-        return SiteSettings()
-    
-    return SiteSettings(**settings, id=str(settings["_id"]))
+    # Served from memory, returns defaults if the settings were never saved
+    return await settings_cache.get()
 
 @router.put("/", response_model=SiteSettings)
 async def update_settings(settings_in: SettingsUpdate, current_user: User = Depends(get_current_user)) -> Any:
@@ -31,9 +25,11 @@ async def update_settings(settings_in: SettingsUpdate, current_user: User = Depe
     if existing:
         await mongodb.db.settings.update_one({"_id": existing["_id"]}, {"$set": settings_in.dict(exclude_unset=True)})
         updated = await mongodb.db.settings.find_one({"_id": existing["_id"]})
+        settings_cache.invalidate()
         return SiteSettings(**updated, id=str(updated["_id"]))
     else:
         # Create new
         new_settings = settings_in.dict()
         result = await mongodb.db.settings.insert_one(new_settings)
+        settings_cache.invalidate()
         return SiteSettings(**new_settings, id=str(result.inserted_id))
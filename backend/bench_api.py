@@ -0,0 +1,391 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+import requests
+from bson import ObjectId
+from pymongo import InsertOne
+from app.db.mongodb import mongodb
+from app.db.indexes import ensure_indexes
+from app.core.rollups import rebuild_rollups
+from app.core.security import get_password_hash
+from seed_products import PRODUCTS
+
+# API load test
+# -------------
+# Seeds a synthetic dataset into the configured database and drives the API
+# with realistic scenarios, reporting throughput and p50/p95/p99 per scenario.
+# Results can be saved as a JSON baseline and later runs compared against it.
+#
+#   python bench_api.py seed --products 2000 --users 500 --orders 50000
+#   uvicorn app.main:app --workers 1            (in another shell)
+#   python bench_api.py run --duration 20 --concurrency 16 --save bench_results/baseline.json
+#   python bench_api.py run --duration 20 --concurrency 16 --compare bench_results/baseline.json
+#
+# Seeded documents carry "bench": true, so re-seeding only replaces benchmark
+# data. Use a dedicated database: checkouts create orders and enqueue emails.
+# Run the server with the same settings as the baseline (workers, pool sizes).
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "bench-admin@example.com"
+HOT_PRODUCTS = 3
+HOT_STOCK = 50
+SEARCH_TERMS = ["tintilia", "falanghina", "rosato", "molise", "montepulciano", "barrique", "pesce", "falangina"]
+STATUSES = ["pending", "paid", "paid", "shipped", "shipped", "cancelled"]
+
+def user_email(n: int) -> str:
+    return f"bench-user-{n}@example.com"
+
+def address(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "street": f"Via Roma {rng.randint(1, 200)}",
+        "city": "Campobasso",
+        "province": "CB",
+        "zip_code": "86100",
+        "country": "Italia",
+        "phone": "0874000000",
+    }
+
+# --- Seeding ---
+
+async def seed(products: int, users: int, orders: int, seed_value: int):
+    rng = random.Random(seed_value)
+    await mongodb.connect_to_database()
+    db = mongodb.db
+    try:
+        await ensure_indexes(db)
+        for collection in ("products", "users", "orders"):
+            result = await db[collection].delete_many({"bench": True})
+            print(f"Removed {result.deleted_count} previous benchmark {collection}")
+
+        catalog = []
+        for n in range(products):
+            template = PRODUCTS[n % len(PRODUCTS)]
+            catalog.append({
+                **template,
+                "_id": ObjectId(),
+                "name": f"{template['name']} #{n}",
+                "year": str(2015 + n % 9),
+                "price": round(template["price"] * rng.uniform(0.7, 1.8), 2),
+                # The first few products are the contended ones for the checkout scenario
+                "stock": HOT_STOCK if n < HOT_PRODUCTS else rng.randint(0, 200),
+                "bench": True,
+                "bench_hot": n < HOT_PRODUCTS,
+            })
+        await db.products.insert_many(catalog)
+        print(f"Inserted {len(catalog)} products")
+
+        hashed_password = get_password_hash(BENCH_PASSWORD)
+        people = [{
+            "_id": ObjectId(),
+            "email": ADMIN_EMAIL,
+            "full_name": "Bench Admin",
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_superuser": True,
+            "role": "admin",
+            "bench": True,
+        }]
+        for n in range(users):
+            people.append({
+                "_id": ObjectId(),
+                "email": user_email(n),
+                "full_name": f"Cliente {n}",
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "role": "user",
+                "tax_code": f"BNCUSR80A01B{n % 1000:03d}X",
+                "shipping_address": address(rng),
+                "billing_address": address(rng),
+                "bench": True,
+            })
+        await db.users.insert_many(people)
+        print(f"Inserted {len(people)} users (password: {BENCH_PASSWORD})")
+
+        now = datetime.utcnow()
+        batch = []
+        for n in range(orders):
+            customer = people[1 + rng.randrange(users)] if users else people[0]
+            items = [
+                {"product_id": str(product["_id"]), "name": product["name"], "price": product["price"], "quantity": rng.randint(1, 3)}
+                for product in rng.sample(catalog, min(len(catalog), rng.randint(1, 3)))
+            ]
+            total = round(sum(item["price"] * item["quantity"] for item in items) * 1.22, 2)
+            batch.append(InsertOne({
+                "user_id": str(customer["_id"]),
+                "items": items,
+                "total_amount": total,
+                "status": rng.choice(STATUSES),
+                "customer_name": customer["full_name"],
+                "customer_email": customer["email"],
+                "customer_tax_code": customer.get("tax_code"),
+                "shipping_address": customer.get("shipping_address") or address(rng),
+                "billing_address": customer.get("billing_address") or address(rng),
+                "stripe_payment_intent_id": f"bench_pi_{n}",
+                "vat_rate": 22.0,
+                "created_at": now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+                "bench": True,
+            }))
+            if len(batch) == 1000:
+                await db.orders.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await db.orders.bulk_write(batch, ordered=False)
+        print(f"Inserted {orders} orders")
+
+        days = await rebuild_rollups()
+        print(f"Rebuilt {days} daily rollups")
+    finally:
+        await mongodb.close_database_connection()
+
+async def load_dataset() -> Dict[str, Any]:
+    """Ids the scenarios need, and a fresh stock for the contended products."""
+    await mongodb.connect_to_database()
+    db = mongodb.db
+    try:
+        await db.products.update_many({"bench_hot": True}, {"$set": {"stock": HOT_STOCK}, "$unset": {"stock_holds": ""}})
+        hot = await db.products.find({"bench_hot": True}, {"price": 1, "name": 1}).to_list(HOT_PRODUCTS)
+        product_ids = [str(p["_id"]) async for p in db.products.find({"bench": True}, {"_id": 1}).limit(1000)]
+        users = await db.users.count_documents({"bench": True, "role": "user"})
+    finally:
+        await mongodb.close_database_connection()
+    if not product_ids or not users:
+        raise SystemExit("No benchmark data found, run `python bench_api.py seed` first")
+    return {"hot_products": hot, "product_ids": product_ids, "users": users}
+
+# --- Load generation ---
+
+class Client:
+    """One HTTP session per worker thread; returns (status, seconds) for each request."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def request(self, method: str, path: str, **kwargs) -> Tuple[requests.Response, float]:
+        started = time.perf_counter()
+        response = self.session.request(method, self.base_url + path, timeout=30, **kwargs)
+        return response, time.perf_counter() - started
+
+    def login(self, email: str) -> str:
+        response, _ = self.request("POST", "/auth/login", data={"username": email, "password": BENCH_PASSWORD})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+def build_scenarios(client: Client, dataset: Dict[str, Any], tokens: Dict[str, str], site: Dict[str, Any]) -> Dict[str, Callable]:
+    rng = random.Random()
+    customers = [email for email in tokens if email != ADMIN_EMAIL]
+
+    def auth(email: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {tokens[email]}"}
+
+    def browse():
+        step = rng.random()
+        if step < 0.4:
+            response, seconds = client.request("GET", "/products/", params={"limit": 24, "view": "summary"})
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor and response.ok:
+                response, more = client.request("GET", "/products/", params={"limit": 24, "view": "summary", "cursor": cursor})
+                seconds += more
+        elif step < 0.7:
+            response, seconds = client.request("GET", f"/products/{rng.choice(dataset['product_ids'])}")
+        else:
+            response, seconds = client.request("GET", "/products/search", params={"q": rng.choice(SEARCH_TERMS), "fuzzy": rng.random() < 0.5})
+        return response, seconds
+
+    def login():
+        email = user_email(rng.randrange(dataset["users"]))
+        return client.request("POST", "/auth/login", data={"username": email, "password": BENCH_PASSWORD})
+
+    def checkout():
+        product = rng.choice(dataset["hot_products"])
+        quantity = 1
+        items_total = product["price"] * (1 + site["vat_rate"] / 100) * quantity
+        shipping = site["shipping_cost"] if items_total < site["free_shipping_threshold"] else 0.0
+        order = {
+            "items": [{"product_id": str(product["_id"]), "name": product["name"], "price": product["price"], "quantity": quantity}],
+            "total_amount": round(items_total + shipping, 2),
+            "shipping_address": address(rng),
+            "billing_address": address(rng),
+            "customer_tax_code": "BNCUSR80A01B000X",
+        }
+        return client.request("POST", "/orders/checkout", json=order, headers=auth(rng.choice(customers)))
+
+    def dashboard():
+        return client.request("GET", "/analytics/dashboard", params={"days": 30}, headers=auth(ADMIN_EMAIL))
+
+    def orders():
+        if rng.random() < 0.5:
+            return client.request("GET", "/orders/", params={"limit": 50, "view": "summary"}, headers=auth(ADMIN_EMAIL))
+        return client.request("GET", "/orders/mine", params={"view": "summary"}, headers=auth(rng.choice(customers)))
+
+    return {"browse": browse, "login": login, "checkout": checkout, "dashboard": dashboard, "orders": orders}
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_scenario(name: str, scenario: Callable, duration: float, warmup: float, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    counts = {"ok": 0, "rejected": 0, "errors": 0}
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            try:
+                response, seconds = scenario()
+                # Checkout losing the race for the last bottles is expected under contention
+                outcome = "ok" if response.ok else "rejected" if response.status_code in (400, 409) else "errors"
+            except requests.RequestException:
+                seconds, outcome = 0.0, "errors"
+            if time.perf_counter() < measure_from:
+                continue
+            with lock:
+                counts[outcome] += 1
+                if outcome != "errors":
+                    latencies.append(seconds)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+
+    latencies.sort()
+    total = sum(counts.values())
+    return {
+        "requests": total,
+        "throughput_rps": round(total / duration, 1),
+        **counts,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run(args) -> Dict[str, Any]:
+    dataset = asyncio.run(load_dataset())
+    client = Client(args.base_url)
+    site = client.request("GET", "/settings/")[0].json()
+    site = {
+        "vat_rate": site.get("vat_rate", 22.0),
+        "shipping_cost": site.get("shipping_cost", 10.0),
+        "free_shipping_threshold": site.get("free_shipping_threshold", 100.0),
+    }
+    # Log in up front so only the login scenario pays for password hashing
+    emails = [ADMIN_EMAIL] + [user_email(n) for n in range(min(dataset["users"], args.concurrency * 2))]
+    tokens = {email: client.login(email) for email in emails}
+    scenarios = build_scenarios(client, dataset, tokens, site)
+
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+    results = {}
+    for name in selected:
+        print(f"Running {name} ({args.concurrency} workers, {args.duration}s)...", flush=True)
+        results[name] = run_scenario(name, scenarios[name], args.duration, args.warmup, args.concurrency)
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        "scenarios": results,
+    }
+
+def print_results(report: Dict[str, Any]):
+    print(f"\n{'scenario':<10} {'req/s':>8} {'ok':>7} {'rejected':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, result in report["scenarios"].items():
+        print(
+            f"{name:<10} {result['throughput_rps']:>8} {result['ok']:>7} {result['rejected']:>8} {result['errors']:>6} "
+            f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8}"
+        )
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Prints the change against the baseline; False if any scenario regressed beyond the tolerance."""
+    ok = True
+    print(f"\nCompared with baseline {baseline.get('revision')} ({baseline.get('created_at')}), tolerance {tolerance:.0%}")
+    for name, result in report["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            print(f"{name:<10} no baseline")
+            continue
+        regressions = []
+        if base["p95_ms"] and result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+        if base["p99_ms"] and result["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"p99 {base['p99_ms']} -> {result['p99_ms']} ms")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"throughput {base['throughput_rps']} -> {result['throughput_rps']} req/s")
+        if result["errors"] > base["errors"]:
+            regressions.append(f"errors {base['errors']} -> {result['errors']}")
+        if regressions:
+            ok = False
+            print(f"{name:<10} REGRESSION: {'; '.join(regressions)}")
+        else:
+            change = (result["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+            print(f"{name:<10} ok (p95 {change:+.0f}%)")
+    return ok
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="ColleShop API load test")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="Seed a synthetic dataset")
+    seed_parser.add_argument("--products", type=int, default=500)
+    seed_parser.add_argument("--users", type=int, default=200)
+    seed_parser.add_argument("--orders", type=int, default=10000)
+    seed_parser.add_argument("--seed", type=int, default=42, help="Random seed, for reproducible datasets")
+
+    run_parser = commands.add_parser("run", help="Run the scenarios against a running server")
+    run_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    run_parser.add_argument("--scenarios", default="", help="Comma separated: browse,login,checkout,dashboard,orders")
+    run_parser.add_argument("--duration", type=float, default=15.0, help="Measured seconds per scenario")
+    run_parser.add_argument("--warmup", type=float, default=2.0)
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--save", help="Write the results to this JSON file")
+    run_parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on regression")
+    run_parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown")
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        asyncio.run(seed(args.products, args.users, args.orders, args.seed))
+        return 0
+
+    report = run(args)
+    print_results(report)
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 0 if compare(report, baseline, args.tolerance) else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import asyncio
+import sys
+from bench_utils import measure_loop_delay, delay_summary
+from app.core.security import get_password_hash, verify_password, verify_password_async
+
+# Login storm benchmark: N concurrent password verifications while the loop
+# delay seen by an unrelated request is measured (bench_utils). Compares verifying on the event loop (old behaviour)
+# with the bounded hashing pool.
+# Usage: python bench_password_hashing.py [concurrent_logins]
+
+async def storm(name, verify, logins, hashed):
+    async def login():
+        result = verify("secret-password", hashed)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    results, elapsed, latencies = await measure_loop_delay(lambda: asyncio.gather(*[login() for _ in range(logins)]))
+    assert all(results)
+
+    print(f"--- {name} ---")
+    print(f"Logins: {logins} in {elapsed:.2f}s -> {logins / elapsed:.1f} logins/s")
+    print(delay_summary(latencies))
+
+async def main(logins):
+    hashed = get_password_hash("secret-password")
+    await storm("event loop (blocking)", verify_password, logins, hashed)
+    await storm("hashing pool", verify_password_async, logins, hashed)
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 32))
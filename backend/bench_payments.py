@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+import time
+from fake_stripe import start_fake_stripe
+from bench_utils import measure_loop_delay, delay_summary
+
+# Checkout payment benchmark against the local fake Stripe server: N concurrent
+# PaymentIntent creations while the loop delay seen by an unrelated request is
+# measured (bench_utils). Compares calling the SDK inside the coroutine (old
+# behaviour) with the payment gateway's pool, then checks idempotency and the
+# circuit breaker.
+# Usage: python bench_payments.py [concurrent_checkouts] [stripe_latency_seconds]
+
+fake = start_fake_stripe(latency=float(sys.argv[2]) if len(sys.argv) > 2 else 0.3)
+os.environ["STRIPE_API_BASE"] = fake.base_url
+os.environ["STRIPE_SECRET_KEY"] = "sk_test_fake"
+os.environ["STRIPE_MAX_RETRIES"] = "0"
+os.environ["STRIPE_BREAKER_FAILURES"] = "3"
+
+import stripe
+from bson import ObjectId
+from app.core.payments import payment_gateway, PaymentUnavailable
+
+def blocking_create(order_id):
+    stripe.api_key = "sk_test_fake"
+    stripe.api_base = fake.base_url
+    return stripe.PaymentIntent.create(amount=2928, currency="eur", automatic_payment_methods={"enabled": True})
+
+async def storm(name, create, checkouts):
+    async def checkout():
+        result = create(str(ObjectId()))
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    _, elapsed, latencies = await measure_loop_delay(lambda: asyncio.gather(*[checkout() for _ in range(checkouts)]))
+
+    print(f"--- {name} ---")
+    print(f"Checkouts: {checkouts} in {elapsed:.2f}s -> {checkouts / elapsed:.1f} checkouts/s")
+    print(delay_summary(latencies))
+
+async def check_idempotency() -> bool:
+    order_id = str(ObjectId())
+    first = await payment_gateway.create_payment_intent(2928, order_id)
+    second = await payment_gateway.create_payment_intent(2928, order_id)
+    ok = first["id"] == second["id"]
+    print(f"Idempotency: same order -> {'same intent' if ok else 'DIFFERENT intents (FAIL)'}")
+    return ok
+
+async def check_breaker() -> bool:
+    fake.failure_rate = 1.0
+    outcomes = []
+    for _ in range(5):
+        started = time.perf_counter()
+        try:
+            await payment_gateway.create_payment_intent(2928, str(ObjectId()))
+            outcomes.append("ok")
+        except PaymentUnavailable:
+            outcomes.append(f"unavailable {(time.perf_counter() - started) * 1000:.0f}ms")
+    fake.failure_rate = 0.0
+    print(f"Breaker with Stripe failing: {', '.join(outcomes)} -> {payment_gateway.breaker.state}")
+    return payment_gateway.breaker.state == "open"
+
+async def main(checkouts):
+    await storm("SDK on the event loop (blocking)", blocking_create, checkouts)
+    await storm("payment gateway pool", lambda order_id: payment_gateway.create_payment_intent(2928, order_id), checkouts)
+    ok = await check_idempotency()
+    ok = await check_breaker() and ok
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 16)) else 1)
@@ -0,0 +1,64 @@
+import json
+import sys
+import time
+from datetime import datetime
+from typing import List
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from app.models.order import Order
+from app.core.serialization import serialize_documents
+
+# Compares the response_model path (validate every document, encode, json.dumps)
+# with the orjson fast path used by the list endpoints, on synthetic orders.
+# Usage: python bench_serialization.py [seconds_per_case]
+
+def make_orders(count: int) -> List[dict]:
+    address = {"street": "Via Roma 1", "city": "Campobasso", "province": "CB", "zip_code": "86100", "country": "Italia", "phone": "0874000000"}
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": str(ObjectId()),
+            "items": [
+                {"product_id": str(ObjectId()), "name": f"Vino {n}", "price": 24.0, "quantity": 1 + n % 3}
+                for n in range(4)
+            ],
+            "total_amount": 131.76,
+            "status": "paid",
+            "customer_name": "Mario Rossi",
+            "customer_email": "mario@example.com",
+            "customer_tax_code": "RSSMRA80A01B519X",
+            "shipping_address": address,
+            "billing_address": address,
+            "stripe_payment_intent_id": f"pi_{i}",
+            "vat_rate": 22.0,
+            "created_at": datetime.utcnow(),
+        }
+        for i in range(count)
+    ]
+
+adapter = TypeAdapter(List[Order])
+
+def response_model_path(orders):
+    validated = adapter.validate_python(orders)
+    return json.dumps(jsonable_encoder(validated, by_alias=True)).encode()
+
+def fast_path(orders):
+    return serialize_documents(orders, Order)
+
+def measure(func, orders, seconds):
+    runs = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        func(orders)
+        runs += 1
+    return runs / (time.perf_counter() - started)
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    for count in (100, 1000):
+        orders = make_orders(count)
+        assert json.loads(response_model_path(orders)) == json.loads(fast_path(orders))
+        slow = measure(response_model_path, orders, seconds)
+        fast = measure(fast_path, orders, seconds)
+        print(f"{count} orders: response_model {slow:.1f} resp/s, fast path {fast:.1f} resp/s ({fast / slow:.1f}x)")
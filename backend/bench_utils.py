@@ -0,0 +1,39 @@
+import asyncio
+import statistics
+import time
+from typing import Any, Awaitable, Callable, List, Tuple
+
+# Shared by the bench_*.py scripts that check whether work keeps the event loop
+# free: a probe coroutine stands in for an unrelated request and records how
+# late the loop lets it run while the benchmarked work is going on.
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+async def probe(latencies, stop):
+    """An 'unrelated request': wants the loop for a moment every 5ms."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        latencies.append((time.perf_counter() - started - 0.005) * 1000)
+
+async def measure_loop_delay(work: Callable[[], Awaitable[Any]]) -> Tuple[Any, float, List[float]]:
+    """Runs work() once the probe is going. Returns (result, elapsed seconds, probe delays in ms)."""
+    latencies: List[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(latencies, stop))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    result = await work()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    return result, elapsed, latencies
+
+def delay_summary(latencies: List[float]) -> str:
+    return (
+        f"Unrelated request delay (ms): p50={statistics.median(latencies):.1f} "
+        f"p95={percentile(latencies, 95):.1f} p99={percentile(latencies, 99):.1f} max={max(latencies):.1f}"
+    )
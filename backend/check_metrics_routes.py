@@ -0,0 +1,58 @@
+import asyncio
+import sys
+from app.main import app
+from app.core.metrics import REQUEST_LATENCY
+
+# Checks that request metrics are labelled with the full route template, router
+# prefix included, so endpoints of different routers don't share a series.
+# Only requests answered before any database access are sent (missing token,
+# invalid id), so no MongoDB is needed:
+#   python check_metrics_routes.py
+
+REQUESTS = [
+    ("/orders/not-an-id", "/orders/{id}"),
+    ("/products/not-an-id", "/products/{id}"),
+    ("/orders/", "/orders/"),
+    ("/orders/mine", "/orders/mine"),
+    ("/health/live", "/health/live"),
+    ("/no/such/page", "unmatched"),
+]
+
+async def get(path: str) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"localhost")],
+        "server": ("localhost", 80), "client": ("127.0.0.1", 50000),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return next(m["status"] for m in messages if m["type"] == "http.response.start")
+
+def routes_seen() -> set:
+    return {dict(labels)["route"] for labels in REQUEST_LATENCY._series}
+
+async def check_metrics_routes() -> bool:
+    ok = True
+    for path, expected in REQUESTS:
+        before = routes_seen()
+        status = await get(path)
+        new = routes_seen() - before
+        label = next(iter(new)) if new else "(already recorded)"
+        passed = expected in routes_seen()
+        ok &= passed
+        print(f"{'OK  ' if passed else 'FAIL'} GET {path} -> {status}, route={label} (expected {expected})")
+    # Same relative path in two routers must not share a series
+    distinct = {"/orders/{id}", "/products/{id}"} <= routes_seen() and "/{id}" not in routes_seen()
+    print(f"{'OK  ' if distinct else 'FAIL'} /orders/{{id}} and /products/{{id}} are recorded separately")
+    return ok and distinct
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(check_metrics_routes()) else 1)
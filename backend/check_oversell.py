@@ -0,0 +1,53 @@
+import asyncio
+import random
+import sys
+from bson import ObjectId
+from app.db.mongodb import mongodb
+from app.core.reservations import reserve_stock
+
+# Stress check for the stock reservation engine: fires many concurrent
+# reservations against a single product and verifies stock never goes negative.
+# Usage: python check_oversell.py [concurrent_checkouts] [initial_stock]
+
+async def check_oversell(concurrency: int, initial_stock: int):
+    await mongodb.connect_to_database()
+    products = mongodb.db.products
+
+    result = await products.insert_one({"name": "Oversell Check", "type": "Test", "price": 1.0, "stock": initial_stock})
+    product_id = str(result.inserted_id)
+    print(f"Created test product {product_id} with stock {initial_stock}")
+
+    async def checkout():
+        qty = random.randint(1, 3)
+        ok = await reserve_stock(ObjectId(), {product_id: qty})
+        return qty if ok else 0
+
+    try:
+        reserved = await asyncio.gather(*[checkout() for _ in range(concurrency)])
+        product = await products.find_one({"_id": result.inserted_id})
+        final_stock = product["stock"]
+        successful = sum(1 for qty in reserved if qty)
+
+        print(f"Checkouts: {concurrency}, successful: {successful}, units reserved: {sum(reserved)}")
+        print(f"Final stock: {final_stock}")
+
+        if final_stock < 0:
+            print("FAIL: stock went negative")
+            return False
+        if initial_stock - sum(reserved) != final_stock:
+            print("FAIL: reserved units don't match the stock decrement")
+            return False
+        if len(product.get("stock_holds", [])) != successful:
+            print("FAIL: hold tags don't match successful reservations")
+            return False
+        print("OK: no oversell")
+        return True
+    finally:
+        await products.delete_one({"_id": result.inserted_id})
+        await mongodb.close_database_connection()
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    initial_stock = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    ok = asyncio.run(check_oversell(concurrency, initial_stock))
+    sys.exit(0 if ok else 1)
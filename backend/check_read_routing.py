@@ -0,0 +1,51 @@
+import asyncio
+import sys
+from pymongo import monitoring
+from app.db.mongodb import mongodb
+
+# Checks where each read workload is routed. Run against a replica set, e.g.
+#   MONGO_URI="mongodb://localhost:27017,localhost:27018,localhost:27019/colleshop?replicaSet=rs0" \
+#   MONGO_CATALOG_READ_PREFERENCE=secondaryPreferred \
+#   MONGO_ANALYTICS_READ_PREFERENCE=secondaryPreferred \
+#   python check_read_routing.py
+# "primary" must always hit the primary; the other workloads should hit a
+# secondary when their read preference allows it and one is available.
+
+class ServedBy(monitoring.CommandListener):
+    def __init__(self):
+        self.servers = {}
+
+    def started(self, event):
+        if event.command_name in ("find", "aggregate", "count"):
+            self.servers[event.request_id] = event.connection_id
+
+    def succeeded(self, event): pass
+    def failed(self, event): pass
+
+async def check_read_routing() -> bool:
+    listener = ServedBy()
+    monitoring.register(listener)
+    await mongodb.connect_to_database()
+    try:
+        hello = await mongodb.db.command("hello")
+        primary = hello.get("primary")
+        if not hello.get("setName"):
+            print("Not a replica set: every workload reads from the standalone server")
+        ok = True
+        for workload in ("primary", "catalog", "analytics"):
+            listener.servers.clear()
+            db = mongodb.get_db(workload)
+            await db.products.find_one({}, {"_id": 1})
+            host, port = next(iter(listener.servers.values()))
+            served_by = f"{host}:{port}"
+            on_primary = primary is None or served_by == primary
+            print(f"{workload:<10} {db.read_preference.mongos_mode:<20} -> {served_by} ({'primary' if on_primary else 'secondary'})")
+            if workload == "primary" and not on_primary:
+                print("FAIL: primary workload read from a secondary")
+                ok = False
+        return ok
+    finally:
+        await mongodb.close_database_connection()
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(check_read_routing()) else 1)
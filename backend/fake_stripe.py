@@ -0,0 +1,111 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Minimal local stand-in for the Stripe API, enough for creating and retrieving
+# PaymentIntents.
+# It answers after a configurable latency, fails a configurable share of calls
+# with 500s and honours Idempotency-Key like Stripe does (same key, same intent).
+# Point the backend at it with STRIPE_API_BASE=http://127.0.0.1:12111 and any
+# STRIPE_SECRET_KEY.
+# Usage: python fake_stripe.py [--port 12111] [--latency 0.5] [--failure-rate 0]
+
+class FakeStripeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.5, failure_rate: float = 0.0):
+        super().__init__(address, FakeStripeHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.intents_by_key = {}
+        self.intents_by_id = {}
+        self.created = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    server: FakeStripeServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            intent = self.server.intents_by_id.get(self.path.rsplit("/", 1)[-1])
+        time.sleep(self.server.latency)
+        if not self.path.startswith("/v1/payment_intents/") or intent is None:
+            self.reply(404, {"error": {"type": "invalid_request_error", "message": f"No such payment_intent ({self.path})"}})
+            return
+        self.reply(200, intent)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        params = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+
+        if self.path != "/v1/payment_intents":
+            self.reply(404, {"error": {"type": "invalid_request_error", "message": f"Unrecognized request URL ({self.path})"}})
+            return
+        if random.random() < self.server.failure_rate:
+            self.reply(500, {"error": {"type": "api_error", "message": "Fake Stripe failure"}})
+            return
+
+        key = self.headers.get("Idempotency-Key")
+        with self.server.lock:
+            intent = self.server.intents_by_key.get(key) if key else None
+            if intent is None:
+                intent_id = "pi_fake_" + uuid.uuid4().hex[:24]
+                intent = {
+                    "id": intent_id,
+                    "object": "payment_intent",
+                    "amount": int(params.get("amount", 0)),
+                    "currency": params.get("currency", "eur"),
+                    "status": "requires_payment_method",
+                    "client_secret": f"{intent_id}_secret_{uuid.uuid4().hex[:16]}",
+                    "metadata": {k[len("metadata["):-1]: v for k, v in params.items() if k.startswith("metadata[")},
+                }
+                self.server.created += 1
+                self.server.intents_by_id[intent_id] = intent
+                if key:
+                    self.server.intents_by_key[key] = intent
+        self.reply(200, intent)
+
+def start_fake_stripe(port: int = 0, latency: float = 0.5, failure_rate: float = 0.0) -> FakeStripeServer:
+    """Starts the server on a background thread (port 0 picks a free port)."""
+    server = FakeStripeServer(("127.0.0.1", port), latency, failure_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake Stripe API")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with 500")
+    args = parser.parse_args()
+    server = FakeStripeServer(("127.0.0.1", args.port), args.latency, args.failure_rate)
+    print(f"Fake Stripe listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,80 @@
+import asyncio
+import sys
+from app.db.mongodb import mongodb
+from app.db.indexes import INDEXES, RETIRED_INDEXES, ROUTE_QUERIES, ensure_indexes
+
+# Index maintenance for the collections declared in app/db/indexes.py
+# Usage:
+#   python manage_indexes.py ensure   -> create missing indexes
+#   python manage_indexes.py report   -> missing, undeclared and unused indexes
+#   python manage_indexes.py explain  -> check every route query uses an index and,
+#                                        when sorted, gets its order from it (exit 1 if not)
+
+def plan_stages(plan):
+    """Yields every stage name of an explain winning plan."""
+    # Slot-based engine plans wrap the classic tree in queryPlan
+    plan = plan.get("queryPlan", plan)
+    yield plan.get("stage")
+    for child in plan.get("inputStages", []) + ([plan["inputStage"]] if "inputStage" in plan else []):
+        yield from plan_stages(child)
+
+async def report():
+    db = mongodb.db
+    for collection, indexes in INDEXES.items():
+        existing = await db[collection].index_information()
+        declared = {index.document["name"] for index in indexes}
+        usage = {
+            stat["name"]: stat["accesses"]["ops"]
+            async for stat in db[collection].aggregate([{"$indexStats": {}}])
+        }
+
+        print(f"--- {collection} ---")
+        for name in sorted(declared - set(existing)):
+            print(f"MISSING    {name}")
+        retired = set(RETIRED_INDEXES.get(collection, []))
+        for name in sorted(set(existing) - declared - {"_id_"}):
+            print(f"RETIRED    {name} (dropped by ensure)" if name in retired else f"UNDECLARED {name}")
+        for name in sorted(set(existing)):
+            if usage.get(name, 0) == 0:
+                print(f"UNUSED     {name} (no operations since the last server restart)")
+    return True
+
+async def explain():
+    ok = True
+    for collection, query, sort in ROUTE_QUERIES:
+        cursor = mongodb.db[collection].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        result = await cursor.explain()
+        stages = set(plan_stages(result["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            verdict = "SCAN"
+        elif "SORT" in stages:
+            # Blocking in-memory sort over every match: the index doesn't give the order
+            verdict = "SORT"
+        else:
+            verdict = "OK  "
+        ok = ok and verdict == "OK  "
+        print(f"{verdict} {collection} {query} sort={sort}")
+    return ok
+
+async def main(command: str):
+    await mongodb.connect_to_database()
+    try:
+        if command == "ensure":
+            await ensure_indexes(mongodb.db)
+            print("Indexes ensured.")
+            return True
+        if command == "report":
+            return await report()
+        if command == "explain":
+            return await explain()
+        print(f"Unknown command: {command}")
+        return False
+    finally:
+        await mongodb.close_database_connection()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    ok = asyncio.run(main(command))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,17 @@
+import asyncio
+from app.db.mongodb import mongodb
+from app.core.rollups import rebuild_rollups
+
+# Recomputes the daily_sales rollups from the orders collection.
+# Run once after deploying the rollups, or whenever they need a backfill.
+
+async def main():
+    await mongodb.connect_to_database()
+    try:
+        days = await rebuild_rollups()
+        print(f"Rebuilt daily sales rollups for {days} days.")
+    finally:
+        await mongodb.close_database_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())